@@ -0,0 +1,57 @@
+"""
+Benchmark of the coordinate parsing: the previous str.split(',', expand=True) path against
+coordinate_parser.parse_coordinate_column, on synthetic ragged trajectories.
+
+Run from the project root:  python benchmarks/bench_coordinate_parsing.py [num_rows] [max_samples]
+"""
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'code'))
+from coordinate_parser import parse_coordinate_column
+
+
+def make_coordinate_column(num_rows, max_samples, seed=0):
+    """
+    Create a column of comma-separated pixel coordinates with ragged lengths.
+    """
+    rng = np.random.default_rng(seed)
+    lengths = rng.integers(max(2, max_samples // 10), max_samples + 1, size=num_rows)
+    return pd.Series([','.join(map(str, rng.integers(0, 1920, size=length))) for length in lengths])
+
+
+def split_expand(column):
+    """
+    The previous parsing path of Preprocessing.__init__.
+    """
+    matrix = column.str.split(',', expand=True)
+    matrix = matrix.reset_index(drop=True)
+    matrix = matrix.to_numpy()
+    matrix = matrix.astype(np.float64)
+    return np.transpose(matrix)
+
+
+def best_time(function, column, repeats):
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function(column)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+if __name__ == "__main__":
+    num_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    max_samples = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    column = make_coordinate_column(num_rows, max_samples)
+
+    legacy_time, legacy = best_time(split_expand, column, 3)
+    parser_time, (parsed, bad_rows) = best_time(parse_coordinate_column, column, 3)
+    assert np.array_equal(legacy, parsed, equal_nan=True) and len(bad_rows) == 0
+
+    print(f"rows: {num_rows}, max samples per row: {max_samples}")
+    print(f"str.split(expand=True): {legacy_time:.4f} s")
+    print(f"parse_coordinate_column: {parser_time:.4f} s  ({legacy_time / parser_time:.1f}x faster)")
@@ -0,0 +1,187 @@
+"""
+Benchmark suite of the preprocessing and visualization pipeline.
+
+A synthetic study is generated (see synthetic_data.py) and every stage is timed separately:
+CSV load, coordinate parsing, Preprocessing initialization, normalize_time_points, rescale, remap_trajectories,
+each measure, merge/write of the unified dataset (per output format) and Visualization load/plot.
+The results are written as JSON, so that runs of different versions can be compared.
+
+Run from the project root:
+    python benchmarks/run_benchmarks.py --subjects 20 --trials 60 --samples 60 --output bench_results.json
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+import matplotlib
+matplotlib.use('Agg')  # plots are rendered without a display
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+
+BENCHMARKS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(BENCHMARKS_DIRECTORY, os.pardir, 'code'))
+from Preprocessing import Preprocessing
+from coordinate_parser import parse_coordinate_column
+from measures import MEASURES, resolve_measures
+from output_formats import unified_dataset_path, write_unified_dataset
+from Visualization import Visualization
+from synthetic_data import generate_study
+
+class StageTimer(object):
+    """
+    Accumulates the wall time of every stage over all the subjects and repetitions.
+    """
+    def __init__(self):
+        self.times = OrderedDict()
+
+    def time(self, stage, function, *args, **kwargs):
+        start = time.perf_counter()
+        result = function(*args, **kwargs)
+        self.times.setdefault(stage, []).append(time.perf_counter() - start)
+        return result
+
+    def results(self):
+        return [{'stage': stage, 'calls': len(times), 'total_seconds': sum(times), 'min_seconds': min(times),
+                 'mean_seconds': sum(times) / len(times)}
+                for stage, times in self.times.items()]
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=BENCHMARKS_DIRECTORY,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def available_formats():
+    formats = ['csv']
+    try:
+        import pyarrow  # noqa: F401 (optional dependency of the columnar formats)
+        formats += ['parquet', 'feather']
+    except ImportError:
+        pass
+    return formats
+
+
+def forget_measures(cur_class):
+    """
+    Drop the memoized measures of a subject, so that the next timing includes their computation.
+    """
+    cur_class.measure_values = {}
+    cur_class.kinematics = None
+
+
+def benchmark_preprocessing(timer, paths, max_deviation_method):
+    """
+    Time every preprocessing stage on every subject file.
+    :Return: (df_list, x_list, y_list) for the merge benchmark
+    """
+    df_list, x_list, y_list = [], [], []
+    for subject, path in enumerate(paths, start=1):
+        csv = timer.time('csv_load', pd.read_csv, path)
+        trajectory_csv = csv.dropna(subset=['x_cord'])
+        timer.time('coordinate_parsing', parse_coordinate_column, trajectory_csv['x_cord'])
+        timer.time('coordinate_parsing', parse_coordinate_column, trajectory_csv['y_cord'])
+
+        cur_class = timer.time('preprocessing_init', Preprocessing, path, 'x_cord', 'y_cord', '', ['response'],
+                               'auto', 0, None, max_deviation_method)
+        timer.time('normalize_time_points', cur_class.normalize_time_points)
+        timer.time('rescale', cur_class.rescale)
+        timer.time('remap_trajectories', cur_class.remap_trajectories)
+        for measure in resolve_measures(timestamps=cur_class.t is not None):
+            forget_measures(cur_class)
+            for requirement in MEASURES[measure].requires:  # the measures it depends on are timed on their own
+                if requirement in MEASURES:
+                    cur_class.get_measure(requirement)
+            timer.time('measure_' + measure, cur_class.get_measure, measure)
+        forget_measures(cur_class)
+        timer.time('calculate_all_measures', cur_class.calculate_all_measures)
+
+        cur_class.df['subject_id'] = subject
+        x_full, y_full = cur_class.get_coordinate_arrays()
+        df_list.append(cur_class.df)
+        x_list.append(x_full)
+        y_list.append(y_full)
+    return df_list, x_list, y_list
+
+
+def benchmark_output(timer, df_list, x_list, y_list, output_directory):
+    """
+    Time the merge of all subjects and the writing / visualization of the unified dataset in every format.
+    :Return: dict of the output file sizes in bytes
+    """
+    sizes = {}
+    big_df = timer.time('merge', lambda: pd.concat(df_list).reset_index())
+    big_x = np.concatenate(x_list, axis=1)
+    big_y = np.concatenate(y_list, axis=1)
+    for output_format in available_formats():
+        path = unified_dataset_path(output_directory, output_format)
+        timer.time('write_' + output_format, write_unified_dataset, big_df, big_x, big_y, path)
+        base = os.path.splitext(path)[0]
+        sizes[output_format] = sum(os.path.getsize(output_directory + os.sep + name)
+                                   for name in os.listdir(output_directory) if name.startswith(os.path.basename(base)))
+
+        viz = timer.time('visualization_load_' + output_format, Visualization, path, output_directory, '',
+                         'trajectory', [], '', [], 16, 12, 10, 12, 4, [(205, 92, 92), (0, 206, 209)], 1,
+                         headless=True)
+        timer.time('plot_means', viz.plot_means)
+        timer.time('plot_subject', viz.plot_subject)
+        plt.close('all')
+    return sizes
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--subjects', type=int, default=20, help='number of synthetic subjects')
+    parser.add_argument('--trials', type=int, default=60, help='experimental trials per subject')
+    parser.add_argument('--samples', type=int, default=60, help='average samples per trajectory')
+    parser.add_argument('--extra-rows', type=int, default=10, help='rows without trajectory data per subject')
+    parser.add_argument('--repeats', type=int, default=1, help='number of repetitions of the whole benchmark')
+    parser.add_argument('--max-deviation-method', default='exact', choices=['exact', 'sampled'])
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='bench_results.json', help='path of the JSON results file')
+    args = parser.parse_args(argv)
+
+    timer = StageTimer()
+    sizes = {}
+    with tempfile.TemporaryDirectory() as directory:
+        data_directory = directory + os.sep + 'data'
+        output_directory = directory + os.sep + 'output'
+        os.makedirs(output_directory)
+        paths = timer.time('generate_data', generate_study, data_directory, args.subjects, args.trials,
+                           args.samples, args.extra_rows, args.seed)
+        for _ in range(args.repeats):
+            df_list, x_list, y_list = benchmark_preprocessing(timer, paths, args.max_deviation_method)
+            sizes = benchmark_output(timer, df_list, x_list, y_list, output_directory)
+
+    report = {
+        'metadata': {
+            'git_revision': git_revision(),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'parameters': vars(args),
+        },
+        'output_sizes_bytes': sizes,
+        'stages': timer.results(),
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    for stage in report['stages']:
+        print(f"{stage['stage']:<32}{stage['total_seconds']:>10.4f} s  ({stage['calls']} calls)")
+    print("results written to", args.output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
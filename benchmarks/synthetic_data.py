@@ -0,0 +1,88 @@
+"""
+Synthetic jsPsych-style subject files for benchmarks.
+
+Every subject CSV has practice and experimental mouse-tracking trials (x_cord, y_cord and time_cord serialized as
+comma-separated pixel coordinates / timestamps, a 'trajectory' condition column and a 'test_part' column),
+plus rows without trajectory data (e.g. slider responses).
+
+Run from the project root:  python benchmarks/synthetic_data.py OUTPUT_DIRECTORY [num_subjects] [num_trials]
+"""
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+CONTINUE_BUTTON = (640, 560)  # pixel position of the start ("continue") button
+TARGETS_Y = 250
+LEFT_TARGET_X, RIGHT_TARGET_X = 400, 880
+SAMPLING_INTERVAL_MS = 16.7
+
+
+def make_trajectory(rng, num_samples):
+    """
+    Create a single mouse trajectory from the continue button to one of the targets: the cursor rests on the
+    button for a few samples, then moves along a curved path (sometimes first toward the other target)
+    with a bell-shaped velocity profile and some jitter.
+    :Return: (x, y, t) integer pixel coordinates and timestamps in ms, and the side of the chosen target
+    """
+    side = rng.choice(['left', 'right'])
+    target_x = LEFT_TARGET_X if side == 'left' else RIGHT_TARGET_X
+    rest = rng.integers(1, max(2, num_samples // 5))
+    progress = np.concatenate([np.zeros(rest), (1 - np.cos(np.linspace(0, np.pi, num_samples - rest))) / 2])
+    attraction = rng.normal(0, 0.3) * np.sin(np.pi * progress)  # deviation toward the other target
+    x = CONTINUE_BUTTON[0] + (target_x - CONTINUE_BUTTON[0]) * (progress - attraction)
+    y = CONTINUE_BUTTON[1] + (TARGETS_Y - CONTINUE_BUTTON[1]) * progress
+    moving = progress > 0
+    x[moving] += rng.normal(0, 2, moving.sum())
+    y[moving] += rng.normal(0, 2, moving.sum())
+    t = 1760944822550 + np.cumsum(rng.normal(SAMPLING_INTERVAL_MS, 1, num_samples)).astype(np.int64)
+    return np.round(x).astype(int), np.round(y).astype(int), t, side
+
+
+def make_subject(rng, num_trials, num_samples, num_extra_rows, num_practice_trials=2):
+    """
+    Create the data frame of a single subject.
+    :Param num_samples: average number of samples per trajectory (the actual number varies between trials)
+    :Param num_extra_rows: number of rows without trajectory data (slider responses)
+    """
+    rows = []
+    trial_index = 0
+    for trial in range(num_practice_trials + num_trials):
+        length = max(5, int(rng.normal(num_samples, num_samples / 5)))
+        x, y, t, side = make_trajectory(rng, length)
+        rows.append({'rt': float(t[-1] - t[0]), 'trial_type': 'mouse-tracking', 'trial_index': trial_index,
+                     'test_part': 'practice' if trial < num_practice_trials else 'trial',
+                     'trajectory': rng.choice(['shown', 'hidden']), 'choice': side,
+                     'x_cord': ','.join(map(str, x)), 'y_cord': ','.join(map(str, y)),
+                     'time_cord': ','.join(map(str, t)), 'response': np.nan})
+        trial_index += 1
+    for _ in range(num_extra_rows):
+        position = rng.integers(0, len(rows) + 1)
+        rows.insert(position, {'rt': float(rng.integers(500, 3000)), 'trial_type': 'html-slider-response',
+                               'trial_index': 0, 'test_part': 'Slider', 'response': int(rng.integers(0, 101))})
+    df = pd.DataFrame(rows)
+    df['trial_index'] = np.arange(df.shape[0])
+    return df
+
+
+def generate_study(directory, num_subjects=20, num_trials=60, num_samples=60, num_extra_rows=10, seed=0):
+    """
+    Write `num_subjects` synthetic subject CSV files to `directory`.
+    :Return: list of the written file paths
+    """
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths = []
+    for subject in range(1, num_subjects + 1):
+        path = directory + os.sep + 'subject_' + str(subject).zfill(4) + '.csv'
+        make_subject(rng, num_trials, num_samples, num_extra_rows).to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        raise SystemExit(__doc__)
+    generate_study(sys.argv[1],
+                   num_subjects=int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+                   num_trials=int(sys.argv[3]) if len(sys.argv) > 3 else 60)
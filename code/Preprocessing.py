@@ -1,8 +1,12 @@
 import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from scipy import interpolate
-import math
+from coordinate_parser import parse_coordinate_column
+from trajectory_engine import resample_trajectories, compact_columns, sample_extents, drop_unpaired_samples
+from kinematics import kinematic_profiles
+from measures import MEASURES, STAGES, KINEMATICS, TIMESTAMPS, resolve_measures
+from profiling import no_stage
+from rank_choices import rank_dataframe, PRACTICE_TRIALS as RANK_PRACTICE_TRIALS, REQUIRED_COLUMNS as RANK_COLUMNS
 
 
 class Preprocessing(object):
@@ -28,16 +32,48 @@ class Preprocessing(object):
         Number of leading trajectory rows that should be discarded (manual mode only).
     num_trials : int | None
         Number of experimental trajectory rows to keep after discarding practice rows (manual mode only).
+    max_deviation_method : {'exact', 'sampled'}
+        - 'exact'   → closed-form distance from each point to the straight line segment (default)
+        - 'sampled' → legacy approximation using NUM_TIMEPOINTS points sampled along the straight line
+    time_column : str, optional
+        Column with the serialized timestamps (ms) of the samples, like the x/y coordinates.
+        Enables the kinematic measures (velocity, acceleration, movement initiation) in real time.
+    num_timepoints : int
+        Number of time points of the normalized trajectories (default NUM_TIMEPOINTS = 101), at least 2.
+        The initiation angle is measured at 10% of the normalized trajectory (at least at the second time point).
+    dtype : {'float64', 'float32'}
+        Float type of the coordinate matrices and measures. 'float32' halves the memory and the size of the stored
+        coordinates. Normalized coordinates then differ from float64 by less than 1e-6, and measures by less than
+        1e-5 (initiation angle: 1e-3 degrees). Timestamps for the kinematic measures are always parsed in float64.
+    rank_choices : bool
+        Add the choice ranking columns of rank_choices.py (choice_rank_string, choice_is_higher_ranked,
+        choice_is_one_more, total_one_more_true) from the Left_option, Right_option and choice columns,
+        on the loaded file before any row is dropped, so that the values match the standalone script.
+    rank_practice_trials : int
+        Number of leading non-blank 'choice' rows treated as practice by the ranking (rank_choices.PRACTICE_TRIALS).
+    rank_seed : int | numpy SeedSequence | None
+        Seed of the random tie-break between items chosen equally often in choice_rank_string.
+    columns_to_keep : list[str] | None, optional
+        Extra columns to carry into the output (e.g. the condition columns). If given, only these columns and the
+        columns used by the preprocessing (coordinates, time, response, preserved, ranking and practice columns)
+        are parsed from the file; None (default) reads all the columns.
+    profile_stage : callable, optional
+        Context manager that measures the loading stages (read_csv, rank_choices, filter_rows, parse_coordinates),
+        e.g. profiling.SubjectProfiler.stage. By default (profiling.no_stage) nothing is measured.
     """
     normalized_x = 1
     normalized_y = 1.5
+    NUM_TIMEPOINTS = 101
     def __init__(self,path,x_cord_column,y_cord_column, response_column = "", columns_to_preserve = [],
-                 practice_mode='auto', num_practice_trials=0, num_trials=None):
+                 practice_mode='auto', num_practice_trials=0, num_trials=None, max_deviation_method='exact',
+                 time_column="", num_timepoints=NUM_TIMEPOINTS, dtype='float64', rank_choices=False,
+                 rank_practice_trials=RANK_PRACTICE_TRIALS, rank_seed=None, columns_to_keep=None,
+                 profile_stage=no_stage):
         self.isOK = True
         self.normalized_x = 1
         self.normalized_y = 1.5
         self.max_length = 0
-        self.NUM_TIMEPOINTS = 101
+        self.NUM_TIMEPOINTS = self._check_num_timepoints(num_timepoints)
         self.x_cord_column = x_cord_column
         self.y_cord_column = y_cord_column
         self.practice_mode = practice_mode.lower() if isinstance(practice_mode, str) else 'auto'
@@ -45,47 +81,123 @@ class Preprocessing(object):
             self.practice_mode = 'auto'
         self.num_practice_trials = max(0, num_practice_trials or 0)
         self.num_trials = num_trials if num_trials and num_trials > 0 else None
-        csv = pd.read_csv (path,index_col=None, header=0)
-        #csv = self._drop_invalid_trials(csv)
-        original_csv = csv.copy()  # Keep original for add_slider_data method
-
-        csv = self._filter_practice_trials(csv).reset_index(drop=True)
-
-
-        # Smart filtering: keep rows with trajectory data OR rows with data in columns_to_preserve
-        if columns_to_preserve:
-            # Keep rows that have trajectory data OR have data in any of the preserve columns
-            has_trajectory = csv[x_cord_column].notna()
-            has_preserve_data = csv[columns_to_preserve].notna().any(axis=1)
-            rows_to_keep = has_trajectory | has_preserve_data
-            self.df = csv[rows_to_keep].copy()
-        else:
-            # Default behavior: only keep rows with trajectory data
-            self.df = csv.dropna(subset = [x_cord_column]).copy()
-
-        self.df = self.df.reset_index(drop=True)
-        
-        # Track which rows have trajectory data vs non-trajectory data
-        self.trajectory_rows = self.df[x_cord_column].notna().values
-        self.num_trajectory_rows = self.trajectory_rows.sum()
-        if response_column != "": #  if there is response
-            self.df['explicit_slider'] = self.add_slider_data(original_csv,response_column)
-        
-        # Only process x/y coordinates for rows that have trajectory data
-        trajectory_df = self.df[self.trajectory_rows]
-        self.x = trajectory_df[x_cord_column]
-        self.y = trajectory_df[y_cord_column]
-        self.x = self.x.str.split(',', expand=True)
-        self.x = self.x.reset_index(drop=True)
-        self.x = self.x.to_numpy()  # convert to numpy matrix for future processing
-        self.x = self.x.astype(np.float64)  # convert type from strings to floats
-        self.x = np.transpose(self.x)  # transpose for easier processing (now matrix size is NUM_TIMEPOINTS*NUM_TRAJECTORY_ROWS)
-
-        self.y = self.y.str.split(',', expand=True)
-        self.y = self.y.reset_index(drop=True)
-        self.y = self.y.to_numpy()
-        self.y = self.y.astype(np.float64)
-        self.y = np.transpose(self.y)
+        self.max_deviation_method = max_deviation_method.lower() if isinstance(max_deviation_method, str) else 'exact'
+        if self.max_deviation_method not in ('exact', 'sampled'):
+            self.max_deviation_method = 'exact'
+        self.dtype = np.dtype(dtype) if str(dtype) in ('float32', 'float64') else np.dtype(np.float64)
+        # 10 with 101 time points, at least the second time point at low resolutions
+        self.point_of_angle = max(1, int(round((self.NUM_TIMEPOINTS - 1) / 10)))
+        self.stages_done = []  # preprocessing stages applied to self.x / self.y (see measures.STAGES)
+        self.measure_values = {}  # memoized measures of the trajectory trials, reset when a stage changes x / y
+        self.kinematics = None  # memoized speed/acceleration profiles, reset with the measures
+        used_columns = [x_cord_column, y_cord_column, response_column, time_column] + list(columns_to_preserve)
+        if rank_choices:
+            used_columns += RANK_COLUMNS
+        with profile_stage('read_csv') as counts:
+            csv = self._read_csv(path, used_columns, columns_to_keep, [x_cord_column, y_cord_column, time_column])
+            counts.update(rows=int(csv.shape[0]))
+        if rank_choices:
+            with profile_stage('rank_choices', rows=int(csv.shape[0])):
+                csv = self._add_choice_ranks(csv, path, rank_practice_trials, rank_seed)
+        with profile_stage('filter_rows') as counts:
+            #csv = self._drop_invalid_trials(csv)
+            original_csv = csv  # for add_slider_data; the filters below return new frames and leave it unchanged
+
+            csv = self._filter_practice_trials(csv).reset_index(drop=True)
+
+
+            # Smart filtering: keep rows with trajectory data OR rows with data in columns_to_preserve
+            if columns_to_preserve:
+                # Keep rows that have trajectory data OR have data in any of the preserve columns
+                has_trajectory = csv[x_cord_column].notna()
+                has_preserve_data = csv[columns_to_preserve].notna().any(axis=1)
+                rows_to_keep = has_trajectory | has_preserve_data
+                self.df = csv[rows_to_keep]
+            else:
+                # Default behavior: only keep rows with trajectory data
+                self.df = csv.dropna(subset = [x_cord_column])
+
+            self.df = self.df.reset_index(drop=True)
+
+            # Track which rows have trajectory data vs non-trajectory data
+            self.trajectory_rows = self.df[x_cord_column].notna().values
+            self.num_trajectory_rows = self.trajectory_rows.sum()
+            if response_column != "": #  if there is response
+                self.df['explicit_slider'] = self.add_slider_data(original_csv,response_column)
+            counts.update(rows=int(self.df.shape[0]), trials=int(self.num_trajectory_rows))
+
+        with profile_stage('parse_coordinates', trials=int(self.num_trajectory_rows)) as counts:
+            # Only process x/y coordinates for rows that have trajectory data
+            # the matrices are of size NUM_SAMPLES*NUM_TRAJECTORY_ROWS (NaN-padded) for easier processing
+            trajectory_df = self.df[self.trajectory_rows]
+            self.x, bad_x = parse_coordinate_column(trajectory_df[x_cord_column], self.dtype)
+            self.y, bad_y = parse_coordinate_column(trajectory_df[y_cord_column], self.dtype)
+
+            bad_rows = np.union1d(bad_x, bad_y)
+
+            # Timestamps of the samples in ms from the first sample of the trial (None without a time column).
+            # Trials whose timestamps do not match their coordinates get NaN times.
+            self.t = None
+            if time_column:
+                self.t, bad_t = parse_coordinate_column(trajectory_df[time_column])
+                if self.t.shape[0] > 0:
+                    self.t = self.t - compact_columns(self.t)[0, :]
+                mismatched = np.flatnonzero(sample_extents(self.t) != sample_extents(self.x))
+                self.t[:, mismatched] = np.nan
+                bad_rows = np.union1d(bad_rows, np.union1d(bad_t, mismatched))
+
+            # A sample that is malformed in x, y or t is dropped from all of them, so the other samples stay paired
+            self.x, self.y, self.t = drop_unpaired_samples(self.x, self.y, self.t)
+
+            # Rows with malformed coordinates (positions in self.df), their bad samples are dropped before
+            # normalization
+            self.malformed_rows = np.flatnonzero(self.trajectory_rows)[bad_rows]
+            if len(self.malformed_rows) > 0:
+                print("malformed coordinates in", path, "rows:", list(self.malformed_rows))
+            counts.update(max_samples=int(self.x.shape[0]))
+
+    @staticmethod
+    def _check_num_timepoints(num_timepoints):
+        """
+        Return the number of time points as an int, after checking that it is a whole number of at least 2.
+        """
+        try:
+            is_integer = not isinstance(num_timepoints, bool) and int(num_timepoints) == num_timepoints
+        except (TypeError, ValueError):
+            is_integer = False
+        if not is_integer or num_timepoints < 2:
+            raise ValueError("num_timepoints must be an integer of at least 2, got " + repr(num_timepoints))
+        return int(num_timepoints)
+
+    @staticmethod
+    def _read_csv(path, used_columns, columns_to_keep, coordinate_columns):
+        """
+        Read the subject file, with the serialized coordinate columns as text.
+        With a keep-list, the parser skips all the other columns of the export (stimulus HTML, browser metadata...),
+        which are most of its parse time and memory. 'test_part' and 'trial_num' are always kept for the
+        practice filtering.
+        """
+        dtypes = {column: str for column in coordinate_columns if column}
+        if columns_to_keep is None:
+            return pd.read_csv(path, index_col=None, header=0, dtype=dtypes)
+        wanted = [column for column in list(used_columns) + list(columns_to_keep) if column]
+        wanted = set(wanted + ['test_part', 'trial_num'])
+        csv = pd.read_csv(path, index_col=None, header=0, dtype=dtypes, usecols=lambda column: column in wanted)
+        missing = [column for column in columns_to_keep if column and column not in csv.columns]
+        if missing:
+            print("columns to keep missing in", path, ":", missing)
+        return csv
+
+    @staticmethod
+    def _add_choice_ranks(csv, path, practice_trials, seed):
+        """
+        Ranking stage of rank_choices.py on the whole loaded file (practice rows are counted over the 'choice'
+        column, as in the standalone script).
+        """
+        missing = [column for column in RANK_COLUMNS if column not in csv.columns]
+        if missing:
+            raise ValueError("Ranking choices needs the columns " + str(missing) + ", which are missing in " + path)
+        return rank_dataframe(csv, practice_trials, seed)
 
     def _filter_practice_trials(self, csv):
         """
@@ -116,7 +228,6 @@ class Preprocessing(object):
         Remove the leading practice trials (based on the number of valid trajectories)
         and optionally cap the number of remaining experimental trials.
         """
-        csv = csv.copy()
         if self.num_practice_trials > 0:
             trajectory_indices = csv[csv[self.x_cord_column].notna()].index
             practice_indices = trajectory_indices[:self.num_practice_trials]
@@ -136,8 +247,8 @@ class Preprocessing(object):
         Returns: (x_full, y_full) where each has shape (NUM_TIMEPOINTS, total_rows)
         """
         # Always return arrays matching dataframe shape
-        x_full = np.full([self.NUM_TIMEPOINTS, self.df.shape[0]], np.nan)
-        y_full = np.full([self.NUM_TIMEPOINTS, self.df.shape[0]], np.nan)
+        x_full = np.full([self.NUM_TIMEPOINTS, self.df.shape[0]], np.nan, dtype=self.dtype)
+        y_full = np.full([self.NUM_TIMEPOINTS, self.df.shape[0]], np.nan, dtype=self.dtype)
 
         # If subject is valid and has trajectory data, fill in the coordinates
         if self.isOK and hasattr(self, 'x') and hasattr(self, 'y') and self.x is not None and self.y is not None:
@@ -171,26 +282,15 @@ class Preprocessing(object):
 
     def normalize_time_points(self):
         """
-        This function uses linear interpolation to normalize all of the trajectories to 100 time points from start to finish.
+        This function uses linear interpolation to normalize all of the trajectories to NUM_TIMEPOINTS time points
+        from start to finish.
+        All trials are resampled together, each over its own number of recorded samples (see trajectory_engine).
         """
-        #innitialize matrix
-        xnew = np.empty([self.NUM_TIMEPOINTS,self.num_trajectory_rows])
-        ynew = np.empty([self.NUM_TIMEPOINTS,self.num_trajectory_rows])
-
-        for i in range (self.num_trajectory_rows): #run over trajectory trials
-            x_for_interp = self.x[:,i]
-            x_for_interp = x_for_interp[~np.isnan(x_for_interp)] #remove Nan values in the end of cordinates vectors
-            y_for_interp = self.y[:,i]
-            y_for_interp = y_for_interp[~np.isnan(y_for_interp)]
-            fx = interpolate.interp1d(range(x_for_interp.shape[0]),x_for_interp) #create interpolation function
-            fy = interpolate.interp1d(range(y_for_interp.shape[0]),y_for_interp)
-            norm_tp_x = np.linspace(0,x_for_interp.shape[0]-1,self.NUM_TIMEPOINTS) #create linear space of 100 time points
-            norm_tp_y = np.linspace(0,y_for_interp.shape[0]-1,self.NUM_TIMEPOINTS)
-            xnew[:,i] = fx(norm_tp_x) #apply interpolation function on the linear space
-            ynew[:,i] = fy(norm_tp_y)
-
-        self.x = xnew
-        self.y = ynew
+        self.x = resample_trajectories(self.x, self.NUM_TIMEPOINTS)
+        self.y = resample_trajectories(self.y, self.NUM_TIMEPOINTS)
+        if self.t is not None:  # the time of every normalized time point
+            self.t = resample_trajectories(self.t, self.NUM_TIMEPOINTS)
+        self._stage_done('normalize')
 
     def rescale(self):
         """
@@ -209,6 +309,7 @@ class Preprocessing(object):
         self.targets_y = np.mean(self.y[self.NUM_TIMEPOINTS-1,:])
         self.y -=self.continue_y
         self.y = (-self.y / ((self.continue_y-self.targets_y)))*self.normalized_y
+        self._stage_done('rescale')
 
     def remap_trajectories(self):
         """
@@ -218,203 +319,127 @@ class Preprocessing(object):
         for i in range(self.num_trajectory_rows):
             if self.x[self.NUM_TIMEPOINTS-1,i] < 0: #i.e., if the trajectory ends in the left target
                 self.x[:,i] = -self.x[:,i]
+        self._stage_done('remap')
 
-    def get_x_flips(self):
+    def _stage_done(self, stage):
         """
-        This function calculates number of x flips trial by trial and saves it as a variable 'flips' of the class.
+        Mark a preprocessing stage as applied, and forget the measures calculated on the previous coordinates.
         """
-        self.flips = []
-        for trial in range(self.num_trajectory_rows):
-            bigger, smaller = False, False
-            x_count = 0
-            last_i = 0
-            cur_trial_xcor = []
-            for i in range(1,self.NUM_TIMEPOINTS):
-                if self.x[last_i,trial] > self.x[i,trial]:
-                    last_i += 1
-                    if not bigger:
-                        bigger = True
-                        smaller = False
-                        if i != 1:
-                            x_count += 1
-                            cur_trial_xcor.append (self.x[last_i,trial])
-                    else:
-                        continue
-                if self.x[last_i,trial] < self.x[i,trial]:
-                    last_i += 1
-                    if not smaller:
-                        bigger = False
-                        smaller = True
-                        if i != 1:
-                            x_count += 1
-                            cur_trial_xcor.append (self.x[last_i,trial])
-                    else:
-                        continue
-            self.flips.append(x_count)
+        self.stages_done.append(stage)
+        self.measure_values = {}
+        self.kinematics = None
 
+    def _ensure_stage(self, stage):
+        """
+        Apply the preprocessing stages up to `stage` (normalize → rescale → remap) that were not applied yet.
+        """
+        stage_functions = {'normalize': self.normalize_time_points, 'rescale': self.rescale,
+                           'remap': self.remap_trajectories}
+        for cur_stage in STAGES[:STAGES.index(stage) + 1]:
+            if cur_stage not in self.stages_done:
+                stage_functions[cur_stage]()
 
+    def get_kinematics(self):
+        """
+        This function returns the speed and acceleration profiles of all the trajectory trials
+        (see kinematics.kinematic_profiles), in real time only if a time column was given.
+        The profiles are calculated once for the current coordinates.
+        """
+        if self.kinematics is None:
+            self.kinematics = kinematic_profiles(self.x, self.y, self.t)
+        return self.kinematics
+
+    def get_measure(self, name):
+        """
+        This function returns a measure of all the trajectory trials (see measures.MEASURES).
+        The measure is calculated only when it is first requested: the stages and measures it depends on are
+        computed first, and the result is memoized on the instance.
+        """
+        if name not in self.measure_values:
+            measure = MEASURES[name]
+            if TIMESTAMPS in measure.requires and self.t is None:
+                raise ValueError("Measure '" + name + "' requires the timestamps of the samples (time_column)")
+            for requirement in measure.requires:
+                if requirement in STAGES:
+                    self._ensure_stage(requirement)
+                elif requirement in (KINEMATICS, TIMESTAMPS):
+                    continue
+                else:
+                    self.get_measure(requirement)
+            context = {'num_timepoints': self.NUM_TIMEPOINTS, 'normalized_x': self.normalized_x,
+                       'normalized_y': self.normalized_y, 'max_deviation_method': self.max_deviation_method,
+                       'point_of_angle': self.point_of_angle}
+            context.update({requirement: self.measure_values[requirement] for requirement in measure.requires
+                            if requirement in self.measure_values})
+            if KINEMATICS in measure.requires:
+                context[KINEMATICS] = self.get_kinematics()
+            values = np.asarray(measure.function(self.x, self.y, context))
+            if values.shape != (self.x.shape[1],):
+                raise ValueError("Measure '" + name + "' returned an array of shape " + str(values.shape) +
+                                 ", expected one value per trajectory trial " + str((self.x.shape[1],)))
+            self.measure_values[name] = values
+        return self.measure_values[name]
+
+    def get_x_flips(self):
+        """
+        This function calculates number of x flips trial by trial and saves it as a variable 'flips' of the class.
+        """
+        self.flips = self.get_measure('flips')
 
     def get_RPB(self):
         """
         This funcction calculates the number of times the mouse cursor cross the middle of the X-axis
         """
-        self.RPB = []
-        for trial in range(self.num_trajectory_rows):
-            crosses = 0
-            crosses_cut = 0
-            last_i = 0
-            cur_crosses_ycor = []
-            for i in range(1,self.NUM_TIMEPOINTS):
-                if (self.x[last_i, trial] > 0 > self.x[i, trial]) or (self.x[last_i, trial] < 0 < self.x[i, trial]):
-                    crosses += 1
-                last_i += 1
-            self.RPB.append(crosses)
+        self.RPB = self.get_measure('RPB')
 
     def get_AUC(self):
         """
         This function calculates all area under the curve for the trajectories
         """
-        self.AUC = []
-        for i in range(self.num_trajectory_rows):
-            cur_x = self.x[:, i]
-            cur_y = self.y[:, i]
-            line_x, line_y = self.normalized_x*cur_x, self.normalized_y *cur_x  # create a straight line from (0,0) to the normalized location (default and recommended - 1,1.5).
-            # integrate on the distance between the actual trajectory and a straight line
-            cur_integral = np.trapz(cur_y-line_y, dx=1/self.NUM_TIMEPOINTS)
-            self.AUC.append(cur_integral)
-
-            #possibility - uncomment this section to visualize the integrated part and compare it to the calculated MD and AUC
-
-            #print('AUC='+str(cur_integral))
-            #print('MD=' +str(self.max_deviations[i]))
-            #plt.plot(cur_x,cur_y,color = 'r')
-            #plt.plot(line_x,line_y)
-            #plt.fill_between(cur_x,cur_y,line_y,alpha = 0.4)
-            #plt.ylim(0,1.7)
-            #plt.show()
+        self.AUC = self.get_measure('AUC')
 
     def get_max_deviation(self):
         """
         This function calculates the maximal deviation from the actual trajectory to a
         straight line connecting the starting position and the target.
+        With max_deviation_method='exact' the distance of every point to the line is computed in closed form,
+        with 'sampled' the legacy approximation (distance to the nearest of NUM_TIMEPOINTS points on the line) is used.
         IMPORTANT: this function will only work if you apply the rescale and remap functions first.
         """
-        self.max_deviations = []
-        for i in range(self.num_trajectory_rows):
-            line_x, line_y = (np.linspace(self.x[0, i], self.x[self.NUM_TIMEPOINTS-1, i], self.NUM_TIMEPOINTS),
-                              np.linspace(self.y[0, i], self.y[self.NUM_TIMEPOINTS-1, i], self.NUM_TIMEPOINTS))
-            self.line = np.column_stack((line_x, line_y))
-            distances = []
-            for j in range(self.NUM_TIMEPOINTS):
-                cur_point = np.array([self.x[j, i], self.y[j, i]])
-                norm = np.linalg.norm(self.line-cur_point, axis=1)
-                cur_distance = min(norm)
-                distances.append(cur_distance)
-            self.max_deviations.append(max(distances))
+        self.max_deviations = self.get_measure('max_deviation')
 
     def get_initiation_angle(self):
         """
         This function calculates the angle of the starting movement of the mouse trajectory relative to the y-axis
         """
-        self.initiation_angle = []
-        self.initiation_correspondence = []
-        point_of_angle = 10
-        for trial in range(self.num_trajectory_rows):
-            # calculate angle of the beginning of trajectory from the vector [1,0](x-axis).
-            # see https://stackoverflow.com/questions/42258637/how-to-know-the-angle-between-two-vectors
-            angle = math.atan2(self.y[0, trial]-self.y[point_of_angle, trial],
-                               self.x[point_of_angle, trial]-self.x[0, trial])
-            angle = math.degrees(angle)
-            angle = abs(angle)
-            self.initiation_angle.append(angle)
-            self.initiation_correspondence.append(angle < 90)
-
-            # # uncomment the next lines in order to plot and check the measure validity.
-            # plt.plot(self.x[:,trial],self.y[:,trial],'--o')
-            # plt.plot([self.x[0,trial],self.x[point_of_angle,trial]],[self.y[0,trial],self.y[point_of_angle,trial]])
-            # plt.title(angle)
-            # plt.show()
+        self.initiation_angle = self.get_measure('initiation_angle')
+        self.initiation_correspondence = self.get_measure('initiation_correspondence')
+
     def measure_trajectory_length(self):
-      """
+        """
         This function measures the length of the trajectory course for each trial.
         note that it essential to rescale the data before using this function!
-      """
-      self.length = []
-      for j in range (self.num_trajectory_rows):
-        length = 0
-        #every row is in size of the longest row where all the extra cells are nan
-        for i in range(len (self.x[:,j])-1):
-            #finish when the values become nan
-         #   if (np.isnan(self.x[i + 1,j])):
-         #     continue
-            length += math.sqrt((self.x[i, j] - self.x[i + 1,j]) ** 2 + (self.y[i, j] - self.y[i+1, j]) ** 2)
-        self.length.append(length)
-    def calculate_all_measures(self):
+        """
+        self.length = self.get_measure('trajectory_length')
+
+    def calculate_all_measures(self, measures=None):
         """
         This function calculates the measures (e,g. x flips, max deviation...)
         and saves each measure as a column in the data frame.
         For trajectory rows: calculates all measures
         For non-trajectory rows: fills with NaN
+        :Param measures: list of measure names to calculate (see measures.MEASURES), None or empty for all measures.
+        Only the selected measures and the stages/measures they depend on are computed.
         """
         self.df['is_OK'] = self.isOK
-        if self.isOK:
-            # Calculate measures for trajectory rows only
-            self.get_x_flips()
-            self.get_max_deviation()
-            self.get_RPB()
-            self.get_AUC()
-            self.get_initiation_angle()
-            self.measure_trajectory_length()
-            
-            # Calculate the real minimum trajectory length for each trajectory trial
-            real_min_lengths = []
-            for i in range(self.num_trajectory_rows):
-                start_x = self.x[0, i]
-                start_y = self.y[0, i]
-                end_x = self.x[self.NUM_TIMEPOINTS-1, i]
-                end_y = self.y[self.NUM_TIMEPOINTS-1, i]
-                real_min_length = math.sqrt((end_x - start_x) ** 2 + (end_y - start_y) ** 2)
-                real_min_lengths.append(real_min_length)
-            
+        trajectory_indices = np.where(self.trajectory_rows)[0]
+        for name in resolve_measures(measures, timestamps=self.t is not None):
             # Create arrays for all rows (trajectory + non-trajectory), filled with NaN
-            flips_all = np.full(self.df.shape[0], np.nan)
-            max_dev_all = np.full(self.df.shape[0], np.nan)
-            rpb_all = np.full(self.df.shape[0], np.nan)
-            auc_all = np.full(self.df.shape[0], np.nan)
-            init_angle_all = np.full(self.df.shape[0], np.nan)
-            init_corr_all = np.full(self.df.shape[0], np.nan)
-            traj_length_all = np.full(self.df.shape[0], np.nan)
-            real_min_all = np.full(self.df.shape[0], np.nan)
-            
-            # Fill in values only for trajectory rows
-            trajectory_indices = np.where(self.trajectory_rows)[0]
-            flips_all[trajectory_indices] = self.flips
-            max_dev_all[trajectory_indices] = self.max_deviations
-            rpb_all[trajectory_indices] = self.RPB
-            auc_all[trajectory_indices] = self.AUC
-            init_angle_all[trajectory_indices] = self.initiation_angle
-            init_corr_all[trajectory_indices] = self.initiation_correspondence
-            traj_length_all[trajectory_indices] = self.length
-            real_min_all[trajectory_indices] = real_min_lengths
-            
-            # Assign to dataframe
-            self.df['flips'] = flips_all
-            self.df['max_deviation'] = max_dev_all
-            self.df['RPB'] = rpb_all
-            self.df['AUC'] = auc_all
-            self.df['initiation_angle'] = init_angle_all
-            self.df['initiation_correspondence'] = init_corr_all
-            self.df['trajectory_length'] = traj_length_all
-            self.df['real_min_length'] = real_min_all
-        else:  # if data is not ok, fill all columns with nan
-            self.df['flips'] = (np.full([self.df.shape[0]],np.nan))
-            self.df['max_deviation'] = (np.full([self.df.shape[0]],np.nan))
-            self.df['RPB'] = (np.full([self.df.shape[0]],np.nan))
-            self.df['AUC'] = (np.full([self.df.shape[0]],np.nan))
-            self.df['initiation_angle'] = (np.full([self.df.shape[0]],np.nan))
-            self.df['initiation_correspondence'] = (np.full([self.df.shape[0]],np.nan))
-            self.df['trajectory_length'] = (np.full([self.df.shape[0]],np.nan))
-            self.df['real_min_length'] = (np.full([self.df.shape[0]],np.nan))
+            values_all = np.full(self.df.shape[0], np.nan, dtype=self.dtype)
+            if self.isOK:  # if data is not ok, the column stays nan
+                # Fill in values only for trajectory rows
+                values_all[trajectory_indices] = self.get_measure(name)
+            self.df[name] = values_all
 
 # exmp = Preprocessing(r'C:\Users\mhavi\shalevproject\mouse-tracking-tools-master\data\5a0c4184fe645f0001e9f5dd.csv',3,120,"x_cord","y_cord")
 # exmp.normalize_time_points()
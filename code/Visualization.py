@@ -1,33 +1,87 @@
+import base64
+import html
+import io
 import numpy as np
 import pandas as pd
+import matplotlib
+import matplotlib.image
 import matplotlib.pyplot as plt
 import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.backends.backend_pdf import PdfPages
+from matplotlib.figure import Figure
+from output_formats import read_unified_dataset
+from trajectory_stats import subject_means
+
+def draw_subject_figure(figure, panels, style):
+    """
+    Draw the trajectories of a single subject on a figure, one subplot per panel (see Visualization._subject_panels).
+    """
+    for i, (title, lines) in enumerate(panels):
+        ax = figure.add_subplot(1, len(panels), i+1)
+        for label, color, x, y in lines:
+            ax.plot(x, y, '--o', c=color, label=label, markersize=style['point_size'])
+            ax.tick_params(labelsize=style['ticks_size'])
+        if style['legend']:
+            handles, labels = ax.get_legend_handles_labels()
+            temp = {k: v for k, v in zip(labels, handles)}
+            ax.legend(temp.values(), temp.keys(), loc='best',fontsize=style['legend_size'])
+        ax.set_xlabel('X-coordinate', fontsize=style['labels_size'])
+        ax.set_ylabel('Y-coordinate', fontsize=style['labels_size'])
+        ax.set_title(title, fontsize=style['title_size'])
+
+
+def render_subject_png(panels, style, dpi=100):
+    """
+    Render the figure of a single subject without a display (Agg canvas, no pyplot state), so it can run in
+    worker processes.
+    :Return: the figure as PNG bytes
+    """
+    figure = Figure(figsize=(6.4*max(len(panels), 1), 4.8))
+    FigureCanvasAgg(figure)
+    draw_subject_figure(figure, panels, style)
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format='png', dpi=dpi)
+    return buffer.getvalue()
+
 
 class Visualization (object):
     """
     This class gets csv path for the unified dataset of all participants in the experiment,
     and contain of functions that handle with some parts of the data visualization (other
     parts of the data visualization can be found in the R script)
-    :Param path: path of the unified dat file
+    :Param path: path of the unified data file (csv, parquet or feather, see output_formats)
     :Param study_title: string, will be used as the title of the plot
     :Param subjects_to_remove: list of subject numbers to remove from the plot
+    :Param memory_map: bool, load only the table columns needed for plotting and, for parquet/feather files,
+    memory-map the coordinate arrays, so the trajectories of very large datasets are paged in lazily
+    :Param headless: bool, render without a display (batch runs): plots are saved but not shown
     """
     def __init__(self, path, output_directory, study_title, first_condition_column, first_condition_order,
                  second_condition_column, second_condition_order,
                  title_size, labels_size,ticks_size, legend_size, point_size, colormap,
-                 subject_to_inspect, subjects_to_remove =[], condition_labels = {}):
+                 subject_to_inspect, subjects_to_remove =[], condition_labels = {}, memory_map = False,
+                 headless = False):
         self.output_directory = output_directory
-        self.NUM_TIMEPOINTS = 101
-        self.df = pd.read_csv(path,index_col=None, header=0)
+        self.headless = headless
+        if headless:  # render with a non-interactive backend, plots are saved and closed instead of shown
+            plt.switch_backend('Agg')
+        table_columns = None
+        if memory_map:  # only load the columns that the plots use
+            table_columns = list(dict.fromkeys(column for column in ['subject_id', 'is_OK', first_condition_column,
+                                                                     second_condition_column] if column))
+        # self.x and self.y hold all the rows of the file (memory-mapped for parquet/feather if memory_map is True),
+        # they are indexed by position: self.positions holds the position in the file of every row of self.df
+        # the number of time points is read from the metadata of the file (see output_formats.write_metadata)
+        df, self.x, self.y = read_unified_dataset(path, None, table_columns, memory_map)
+        self.NUM_TIMEPOINTS = self.x.shape[0]
         self.subjects_to_remove = subjects_to_remove
-        self.df = self.df[~self.df['subject_id'].isin(self.subjects_to_remove)]
+        keep = ~df['subject_id'].isin(self.subjects_to_remove).to_numpy()
+        self.df = df[keep]
+        self.positions = np.flatnonzero(keep)
         self.NUM_TRIALS = self.df.shape[0]
-        columns_x = ['x_'+str(i) for i in range(self.NUM_TIMEPOINTS)]
-        columns_y = ['y_'+str(i) for i in range(self.NUM_TIMEPOINTS)]
-        x_df = self.df[columns_x]
-        y_df = self.df[columns_y]
-        self.x = np.transpose(x_df.to_numpy())
-        self.y = np.transpose(y_df.to_numpy())
         self.study_title = study_title
         self.num_subjects = len(self.df['subject_id'].unique())
         self.first_condition_column = first_condition_column
@@ -59,25 +113,101 @@ class Visualization (object):
         # self.num_samples = num_samples
         # self.trajectory_to_inspect = trajectory_to_inspect
         self.point_size = point_size
-        self.ind = []
-        for i in range(len(self.conditions_2)):
-            cur_ind = []
-            for j in range(len(self.conditions_1)):
-                cond_1 = self.conditions_1[j]
-                cond_2 = self.conditions_2[i]
-                if first_condition_column and second_condition_column:
-                    cur_ind.append(self.df.index[(self.df[first_condition_column] == cond_1) &
-                                                 (self.df[second_condition_column] == cond_2) &
-                                                 (self.df['is_OK'] == True)])
-                elif first_condition_column:
-                    cur_ind.append(self.df.index[(self.df[first_condition_column] == cond_1) &
-                                                 (self.df['is_OK'] == True)])
-                elif second_condition_column:
-                    cur_ind.append(self.df.index[(self.df[second_condition_column] == cond_2) &
-                                                 (self.df['is_OK'] == True)])
-                else:
-                    cur_ind.append(self.df.index[(self.df['is_OK'] == True)])
-            self.ind.append(cur_ind)
+        # positions (in self.x / self.y) of the OK trials of every subject and condition cell, built once
+        self.group_index = self._build_group_index()
+        self.cell_index = {}
+        for (subject, cond_1, cond_2), rows in self.group_index.items():
+            self.cell_index.setdefault((cond_1, cond_2), []).append(rows)
+        self.cell_index = {cell: np.sort(np.concatenate(rows)) for cell, rows in self.cell_index.items()}
+        self.ind = [[self.cell_rows(cond_1, cond_2) for cond_1 in self.conditions_1] for cond_2 in self.conditions_2]
+        self._subject_means = None
+        self._statistics_cache = {}
+
+    def _build_group_index(self):
+        """
+        Group the OK trials by subject and condition cell with a single groupby.
+        Conditions that are not used get the value 0, like in self.conditions_1 / self.conditions_2.
+        :Return: dict {(subject_id, cond_1, cond_2): array of the row positions of the trials in the file}
+        """
+        is_ok = (self.df['is_OK'] == True).to_numpy()
+        ok = self.df[is_ok]
+        first, second = self.first_condition_column, self.second_condition_column
+        keys = pd.DataFrame({'subject_id': ok['subject_id'].to_numpy(),
+                             'cond_1': ok[first].to_numpy() if first else 0,
+                             'cond_2': ok[second].to_numpy() if second else 0})
+        rows = self.positions[is_ok]
+        return {key: rows[positions]
+                for key, positions in keys.groupby(['subject_id', 'cond_1', 'cond_2'], sort=False).indices.items()}
+
+    def cell_rows(self, cond_1, cond_2, subject=None):
+        """
+        Returns the row positions of the OK trials of a condition cell, of all subjects or of a single subject.
+        """
+        key = (cond_1, cond_2) if subject is None else (subject, cond_1, cond_2)
+        index = self.cell_index if subject is None else self.group_index
+        return index.get(key, np.array([], dtype=np.intp))
+
+    def get_subject_means(self):
+        """
+        This function averages the trajectories of every subject in every condition cell, in a single grouped
+        reduction over the coordinate arrays (see trajectory_stats.subject_means). Trials without trajectory data
+        are ignored. The result is cached for all plots and exports.
+        :Return: (keys, mean_x, mean_y, num_trials), where keys is the list of (subject_id, cond_1, cond_2) groups,
+        mean_x and mean_y have shape (NUM_TIMEPOINTS, num_groups) and num_trials has the trial count of every group
+        """
+        if self._subject_means is None:
+            keys = list(self.group_index)
+            rows = np.concatenate([self.group_index[key] for key in keys] + [np.array([], dtype=np.intp)])
+            groups = np.repeat(np.arange(len(keys)), [len(self.group_index[key]) for key in keys])
+            coordinates = np.concatenate([np.asarray(self.x[:, rows]), np.asarray(self.y[:, rows])])
+            valid = ~(np.isnan(coordinates).all(axis=0))
+            group_ids, means = subject_means(coordinates[:, valid], groups[valid])
+            keys = [keys[group] for group in group_ids]
+            num_trials = np.bincount(groups[valid], minlength=len(self.group_index))[group_ids]
+            self._subject_means = (keys, means[:self.NUM_TIMEPOINTS], means[self.NUM_TIMEPOINTS:], num_trials)
+        return self._subject_means
+
+    def cell_statistics(self, cond_1, cond_2):
+        """
+        Returns the grand mean trajectory of a condition cell (the mean of the subject means) and its between-subject
+        standard error, as (mean_x, mean_y, se_x, se_y), or None if the cell has no trajectory data.
+        The result is cached for later plots.
+        """
+        if (cond_1, cond_2) not in self._statistics_cache:
+            keys, mean_x, mean_y, _ = self.get_subject_means()
+            in_cell = np.array([key[1:] == (cond_1, cond_2) for key in keys], dtype=bool)
+            statistics = None
+            num_subjects = in_cell.sum()
+            if num_subjects > 0:
+                cell_x, cell_y = mean_x[:, in_cell], mean_y[:, in_cell]
+                ddof = 1 if num_subjects > 1 else 0  # a single subject has no between-subject spread
+                statistics = (cell_x.mean(axis=1), cell_y.mean(axis=1),
+                              cell_x.std(axis=1, ddof=ddof) / np.sqrt(num_subjects),
+                              cell_y.std(axis=1, ddof=ddof) / np.sqrt(num_subjects))
+            self._statistics_cache[(cond_1, cond_2)] = statistics
+        return self._statistics_cache[(cond_1, cond_2)]
+
+    def save_subject_means(self):
+        """
+        This function saves the mean trajectory of every subject in every condition cell to 'Subject means.csv'
+        in the output directory (one row per subject and cell, with its number of trials and x_/y_ coordinates).
+        """
+        keys, mean_x, mean_y, num_trials = self.get_subject_means()
+        columns = ['subject_id', self.first_condition_column or 'condition_1',
+                   self.second_condition_column or 'condition_2']
+        table = pd.concat([pd.DataFrame(keys, columns=columns).assign(num_trials=num_trials),
+                           pd.DataFrame(np.transpose(mean_x)).add_prefix('x_'),
+                           pd.DataFrame(np.transpose(mean_y)).add_prefix('y_')], axis=1)
+        table.to_csv(self.output_directory + os.sep + 'Subject means.csv', index=False)
+
+    def _cell_trajectories(self, rows):
+        """
+        Returns the x and y coordinates of the given rows, without the rows that have no trajectory data.
+        """
+        x = np.asarray(self.x[:, rows])
+        y = np.asarray(self.y[:, rows])
+        valid_rows = ~(np.isnan(x).all(axis=0) | np.isnan(y).all(axis=0))
+        return x[:, valid_rows], y[:, valid_rows]
 
     def _get_display_label(self, condition_value, condition_column):
         """
@@ -105,9 +235,9 @@ class Visualization (object):
             return normalized_colors
         return colors
 
-    def plot_means(self):
+    def _condition_colors(self):
         """
-        This function plot the average mouse trajectory in each condition.
+        Returns the colors of the first-order conditions
         """
         # Count non-NaN conditions to determine number of colors needed
         non_nan_conditions = [cond for cond in self.conditions_1 if not pd.isna(cond)]
@@ -115,9 +245,23 @@ class Visualization (object):
 
         if isinstance(self.colormap, list):
             # If custom colors provided, use them (but limit to needed number)
-            colors = self._normalize_colors(self.colormap[:num_colors_needed] if len(self.colormap) > num_colors_needed else self.colormap)
+            return self._normalize_colors(self.colormap[:num_colors_needed] if len(self.colormap) > num_colors_needed else self.colormap)
+        return plt.cm.get_cmap(self.colormap)(np.linspace(0, 1, num_colors_needed))
+
+    def _show(self):
+        """
+        Show the current figure, or close it when rendering without a display (headless)
+        """
+        if self.headless:
+            plt.close()
         else:
-            colors = plt.cm.get_cmap(self.colormap)(np.linspace(0, 1, num_colors_needed))
+            plt.show()
+
+    def plot_means(self):
+        """
+        This function plot the average mouse trajectory in each condition.
+        """
+        colors = self._condition_colors()
         plt.figure(figsize=(6.4*len(self.conditions_2), 4.8))
         for i in range(len(self.conditions_2)):
             cond_2 = self.conditions_2[i]
@@ -125,28 +269,11 @@ class Visualization (object):
             color_idx = 0  # Separate counter for colors to handle skipped NaN conditions
             for j in range(len(self.conditions_1)):
                 cond_1 = self.conditions_1[j]
-                cur_ind = self.ind[i][j]
-
                 # Skip NaN conditions (non-trajectory rows) as they have no data to plot
-                if pd.isna(cond_1) or len(cur_ind) == 0:
+                statistics = None if pd.isna(cond_1) else self.cell_statistics(cond_1, cond_2)
+                if statistics is None:
                     continue
-
-                x = self.x[:,cur_ind]
-                y = self.y[:,cur_ind]
-                
-                # Filter out rows where all coordinates are NaN (non-trajectory rows)
-                valid_rows = ~(np.isnan(x).all(axis=0) | np.isnan(y).all(axis=0))
-                if valid_rows.sum() == 0:
-                    continue  # Skip if no valid trajectory data
-                
-                x = x[:, valid_rows]
-                y = y[:, valid_rows]
-                mean_x = np.mean(x, axis=1)
-                mean_y = np.mean(y, axis=1)
-                std_y = np.std(y, axis=1)
-                se_y = std_y/np.sqrt(self.num_subjects)
-                std_x = np.std(x, axis=1)
-                se_x = std_x/np.sqrt(self.num_subjects)
+                mean_x, mean_y, se_x, se_y = statistics
                 if self.first_condition_column:
                     display_label = self._get_display_label(cond_1, self.first_condition_column)
                     label =  display_label
@@ -168,74 +295,94 @@ class Visualization (object):
                 ax.set_title(self.study_title, fontsize=self.title_size)
         plt.savefig(self.output_directory + os.sep + 'Average trajectories',
                     dpi=300)
-        plt.show()
+        self._show()
 
-    def plot_subject(self):
+    def plot_subject(self, subject=None):
         """
         This function plots all trajectories of a given subject
-        :Param subject_id: int, the index of the subject
+        :Param subject: int, the id of the subject, by default subject_to_inspect
         """
-        if self.subject_to_inspect:
-            subject_ind = self.df.index[self.df['subject_id']==self.subject_to_inspect]
+        subject = subject or self.subject_to_inspect
+        if subject:
+            figure = plt.figure(figsize=(6.4*len(self.conditions_2), 4.8))
+            draw_subject_figure(figure, self._subject_panels(subject), self._subject_style())
+            plt.savefig(self.output_directory+os.sep+'Subject '+str(subject)+' trajectories',
+                        dpi=300)
+            self._show()
 
-            # Count non-NaN conditions to determine number of colors needed
-            non_nan_conditions = [cond for cond in self.conditions_1 if not pd.isna(cond)]
-            num_colors_needed = len(non_nan_conditions)
+    def _subject_panels(self, subject):
+        """
+        Collect the data of the subject plot: one panel per second-order condition, with the label, color and
+        trajectories (x, y) of every first-order condition.
+        :Return: list of (title, [(label, color, x, y), ...])
+        """
+        colors = self._condition_colors()
+        panels = []
+        for cond_2 in self.conditions_2:
+            lines = []
+            color_idx = 0  # Separate counter for colors to handle skipped NaN conditions
+            for cond_1 in self.conditions_1:
+                # Skip NaN conditions (non-trajectory rows) as they have no data to plot
+                if pd.isna(cond_1):
+                    continue
+                x, y = self._cell_trajectories(self.cell_rows(cond_1, cond_2, subject))
+                if x.shape[1] == 0:
+                    continue  # Skip if no valid trajectory data
 
-            if isinstance(self.colormap, list):
-                # If custom colors provided, use them (but limit to needed number)
-                colors = self._normalize_colors(self.colormap[:num_colors_needed] if len(self.colormap) > num_colors_needed else self.colormap)
+                if self.first_condition_column:
+                    label = self._get_display_label(cond_1, self.first_condition_column)
+                else:
+                    label = str(cond_1)
+                lines.append((label, colors[color_idx], x, y))
+                color_idx += 1
+            if self.second_condition_column:
+                title = 'Subject: '+str(subject)+', ' + self.second_condition_column+': ' + str(cond_2)
             else:
-                colors = plt.cm.get_cmap(self.colormap)(np.linspace(0, 1, num_colors_needed))
+                title = 'Subject: '+str(subject)
+            panels.append((title, lines))
+        return panels
 
-            plt.figure(figsize=(6.4*len(self.conditions_2), 4.8))
-            for i in range(len(self.conditions_2)):
-                cond_2 = self.conditions_2[i]
-                ax = plt.subplot(1, len(self.conditions_2), i+1)
-                color_idx = 0  # Separate counter for colors to handle skipped NaN conditions
-                for j in range(len(self.conditions_1)):
-                    cond_1 = self.conditions_1[j]
-                    cur_ind = self.ind[i][j]
-                    sub_cur_ind = subject_ind.intersection(cur_ind)
+    def _subject_style(self):
+        return {'title_size': self.title_size, 'labels_size': self.labels_size, 'ticks_size': self.ticks_size,
+                'legend_size': self.legend_size, 'point_size': self.point_size,
+                'legend': bool(self.first_condition_column)}
 
-                    # Skip NaN conditions (non-trajectory rows) as they have no data to plot
-                    if pd.isna(cond_1) or len(sub_cur_ind) == 0:
-                        continue
+    def save_subject_report(self, path=None, num_workers=1, dpi=100):
+        """
+        This function renders the trajectories of every subject (like plot_subject) and collects them in a single
+        multi-page report for quality control. The figures are rendered without a display, in parallel over
+        num_workers processes (0 or None uses all cores).
+        :Param path: str, path of the report, '.pdf' (one page per subject) or '.html' (all subjects on one page).
+        Default is 'Subject report.pdf' in the output directory
+        :Param dpi: int, resolution of the rendered figures
+        :Return: path of the report
+        """
+        path = path or self.output_directory + os.sep + 'Subject report.pdf'
+        subjects = np.sort(self.df['subject_id'].unique())
+        render = partial(render_subject_png, style=self._subject_style(), dpi=dpi)
+        panels = (self._subject_panels(subject) for subject in subjects)
+        if num_workers == 1:
+            images = list(map(render, panels))
+        else:
+            with ProcessPoolExecutor(max_workers=num_workers or None) as executor:
+                images = list(executor.map(render, panels))
 
-                    x = self.x[:, sub_cur_ind]
-                    y = self.y[:, sub_cur_ind]
-                    
-                    # Filter out rows where all coordinates are NaN (non-trajectory rows)
-                    valid_rows = ~(np.isnan(x).all(axis=0) | np.isnan(y).all(axis=0))
-                    if valid_rows.sum() == 0:
-                        continue  # Skip if no valid trajectory data
-                    
-                    x = x[:, valid_rows]
-                    y = y[:, valid_rows]
-                    
-                    if self.first_condition_column:
-                        display_label = self._get_display_label(cond_1, self.first_condition_column)
-                        label = display_label
-                    else:
-                        label = str(cond_1)
-                    ax.plot(x, y, '--o', c=colors[color_idx], label=label, markersize=self.point_size)
-                    ax.tick_params(labelsize=self.ticks_size)
-                    color_idx += 1
-                if self.first_condition_column:
-                    handles, labels = ax.get_legend_handles_labels()
-                    temp = {k: v for k, v in zip(labels, handles)}
-                    ax.legend(temp.values(), temp.keys(), loc='best',fontsize=self.legend_size)
-                #ax.set_xlim(-1, 1.1)
-                ax.set_xlabel('X-coordinate', fontsize=self.labels_size)
-                ax.set_ylabel('Y-coordinate', fontsize=self.labels_size)
-                if self.second_condition_column:
-                    ax.set_title(('Subject: '+str(self.subject_to_inspect)+', ' + self.second_condition_column+': '
-                                  + str(cond_2)),  fontsize=self.title_size)
-                else:
-                    ax.set_title(('Subject: '+str(self.subject_to_inspect)), fontsize=self.title_size)
-            plt.savefig(self.output_directory+os.sep+'Subject '+str(self.subject_to_inspect)+' trajectories',
-                        dpi=300)
-            plt.show()
+        if path.endswith('.html'):
+            with open(path, 'w') as f:
+                f.write('<html><head><meta charset="utf-8"><title>' + html.escape(self.study_title or 'Subjects') +
+                        '</title></head><body>\n')
+                for subject, image in zip(subjects, images):
+                    f.write('<h2>Subject ' + html.escape(str(subject)) + '</h2>\n<img src="data:image/png;base64,' +
+                            base64.b64encode(image).decode('ascii') + '">\n')
+                f.write('</body></html>\n')
+        else:
+            with PdfPages(path) as pdf:
+                for image in images:
+                    pixels = matplotlib.image.imread(io.BytesIO(image))
+                    page = Figure(figsize=(pixels.shape[1] / dpi, pixels.shape[0] / dpi))
+                    page.figimage(pixels)
+                    pdf.savefig(page, dpi=dpi)
+        return path
 
     # def plot_subject_mean(self, subject_id):
     #     """
@@ -0,0 +1,61 @@
+import warnings
+import numpy as np
+import pandas as pd
+
+
+def _parse_tokens(buffer, num_tokens, dtype):
+    """
+    Parse a comma-separated buffer of numbers in bulk.
+    Returns (values, malformed), where malformed is a boolean mask of the tokens that are not numbers
+    (those tokens are set to NaN), or None if all the tokens were parsed.
+    """
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')  # numpy only warns when it stops at a malformed token
+        try:
+            values = np.fromstring(buffer, dtype=dtype, sep=',')
+        except (ValueError, DeprecationWarning):
+            values = None
+    if values is not None and values.shape[0] == num_tokens:
+        return values, None
+
+    # slow path: parse token by token to locate the malformed ones
+    tokens = pd.Series(buffer.split(','))
+    values = pd.to_numeric(tokens, errors='coerce').to_numpy(dtype=dtype, na_value=np.nan)
+    malformed = np.isnan(values) & ~tokens.str.strip().str.lower().isin(['nan']).to_numpy()
+    return values, malformed
+
+
+def parse_coordinate_column(column, dtype=np.float64):
+    """
+    This function converts a column of comma-separated coordinates (one trajectory per row) directly into
+    a NaN-padded float matrix, without building an intermediate table of strings.
+    All rows are joined into a single buffer that is parsed at once, and the values are then scattered
+    into their (sample, row) positions according to the number of samples of each row.
+    Malformed tokens (e.g. empty values or text) and missing rows become NaN and are reported.
+    :Param column: pandas Series (or any sequence) of comma-separated coordinate strings
+    :Param dtype: float dtype of the returned matrix
+    :Return: (matrix, bad_rows), where matrix has shape (max_samples, num_rows) and bad_rows is an array with
+    the positions of the rows that contained malformed tokens or no data at all
+    """
+    column = pd.Series(column).reset_index(drop=True)
+    num_rows = column.shape[0]
+    missing = column.isna().to_numpy()
+    strings = column.astype(str).to_numpy()
+    strings[missing] = 'nan'
+    if num_rows == 0:
+        return np.empty([0, 0], dtype=dtype), np.array([], dtype=np.intp)
+
+    counts = np.fromiter((string.count(',') + 1 for string in strings), dtype=np.intp, count=num_rows)
+    values, malformed = _parse_tokens(','.join(strings), counts.sum(), dtype)
+
+    # position of every token inside its own row
+    rows = np.repeat(np.arange(num_rows), counts)
+    starts = np.cumsum(counts) - counts
+    samples = np.arange(values.shape[0]) - np.repeat(starts, counts)
+    matrix = np.full([counts.max(), num_rows], np.nan, dtype=dtype)
+    matrix[samples, rows] = values
+
+    bad = missing.copy()
+    if malformed is not None:
+        bad[rows[malformed]] = True
+    return matrix, np.flatnonzero(bad)
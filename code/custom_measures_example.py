@@ -0,0 +1,41 @@
+"""
+Example plugin with custom trajectory measures.
+
+Load it by adding its name to MEASURE_PLUGINS in main.py:
+    MEASURE_PLUGINS = ['custom_measures_example']
+Every measure receives the x and y matrices of all the trajectory trials of a subject, with shape
+(NUM_TIMEPOINTS, num_trials), and returns one value per trial (see measures.py).
+"""
+import numpy as np
+from measures import register_measure
+
+
+@register_measure('peak_speed', requires=('remap',))
+def peak_speed(x, y, context):
+    """
+    The maximal distance covered between two consecutive normalized time points.
+    """
+    steps = np.sqrt(np.diff(x, axis=0) ** 2 + np.diff(y, axis=0) ** 2)
+    return steps.max(axis=0)
+
+
+@register_measure('peak_speed_timepoint', requires=('remap',))
+def peak_speed_timepoint(x, y, context):
+    """
+    The normalized time point (0 to NUM_TIMEPOINTS-1) at which the peak speed is reached.
+    """
+    steps = np.sqrt(np.diff(x, axis=0) ** 2 + np.diff(y, axis=0) ** 2)
+    return steps.argmax(axis=0) + 1
+
+
+@register_measure('peak_deviation_timepoint', requires=('remap',))
+def peak_deviation_timepoint(x, y, context):
+    """
+    The normalized time point at which the trajectory is farthest from the straight line
+    connecting its start and end points.
+    """
+    line_x, line_y = x[-1, :] - x[0, :], y[-1, :] - y[0, :]
+    line_length = np.sqrt(line_x ** 2 + line_y ** 2)
+    line_length[line_length == 0] = np.nan
+    distances = np.abs(line_x * (y - y[0, :]) - line_y * (x - x[0, :])) / line_length
+    return np.nan_to_num(distances).argmax(axis=0)
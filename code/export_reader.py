@@ -0,0 +1,65 @@
+"""
+Reading of study exports that hold all the participants in a single CSV file.
+
+The export is read in chunks and the rows of every participant are appended to a per-participant CSV file, so that
+memory is bounded by the chunk size and not by the size of the export. The per-participant files are then processed
+like any data directory (see process_across_subjects.process_export), one subject at a time.
+"""
+import os
+import re
+import pandas as pd
+
+SUBJECT_FILE_PREFIX = 'participant_'
+
+
+def participant_file_name(participant, used_names):
+    """
+    Returns a file name for the participant id that is safe on every file system and unique among used_names
+    (lower-case file names, for case-insensitive file systems).
+    """
+    name = SUBJECT_FILE_PREFIX + re.sub(r'[^\w.-]', '_', participant)
+    unique_name, suffix = name, 1
+    while (unique_name + '.csv').lower() in used_names:
+        suffix += 1
+        unique_name = name + '_' + str(suffix)
+    return unique_name + '.csv'
+
+
+def split_export(export_path, participant_column, split_directory, chunk_size=100000):
+    """
+    This function splits a single-file export into one CSV file per participant, reading it in chunks.
+    All values are copied as text, exactly as they appear in the export, so every participant file parses like a
+    file exported for that participant alone. The rows keep their order, also when the rows of a participant are
+    spread over several chunks. Rows without a participant id are skipped and reported.
+    Existing participant files in split_directory (from a previous split) are replaced.
+    :Param export_path: str, path of the export CSV file
+    :Param participant_column: str, column with the participant id of every row
+    :Param split_directory: str, directory of the per-participant files (created if needed)
+    :Param chunk_size: int, number of rows read at a time
+    :Return: dict of participant id -> path of the participant file
+    """
+    os.makedirs(split_directory, exist_ok=True)
+    for file_name in os.listdir(split_directory):
+        if file_name.startswith(SUBJECT_FILE_PREFIX) and file_name.endswith('.csv'):
+            os.remove(split_directory + os.sep + file_name)
+
+    paths = {}
+    used_names = set()
+    num_skipped = 0
+    chunks = pd.read_csv(export_path, index_col=None, header=0, dtype=str, keep_default_na=False,
+                         na_filter=False, chunksize=chunk_size)
+    for chunk in chunks:
+        if participant_column not in chunk.columns:
+            raise ValueError("The participant column '" + participant_column + "' is missing in " + export_path)
+        has_participant = chunk[participant_column].str.strip() != ''
+        num_skipped += int((~has_participant).sum())
+        for participant, rows in chunk[has_participant].groupby(participant_column, sort=False):
+            is_new = participant not in paths
+            if is_new:
+                file_name = participant_file_name(participant, used_names)
+                used_names.add(file_name.lower())
+                paths[participant] = split_directory + os.sep + file_name
+            rows.to_csv(paths[participant], mode='w' if is_new else 'a', header=is_new, index=False)
+    if num_skipped:
+        print("skipped", num_skipped, "rows without a participant id in", export_path)
+    return paths
@@ -0,0 +1,87 @@
+import numpy as np
+
+
+def derivative(values, times):
+    """
+    Differentiate every column of a (timepoints x trials) matrix with respect to its own time axis,
+    with central differences inside the trajectory and one-sided differences at its two ends
+    (like np.gradient, but with a different time axis for every trial).
+    Time steps that are zero or missing (repeated or NaN timestamps) give NaN.
+    :Param values: numpy array of shape (num_timepoints, num_trials)
+    :Param times: numpy array of shape (num_timepoints, num_trials), or (num_timepoints,) for a time axis
+    that is shared by all trials
+    :Return: numpy array of shape (num_timepoints, num_trials)
+    """
+    times = np.asarray(times, dtype=values.dtype)
+    if times.ndim == 1:
+        times = times[:, np.newaxis]
+    result = np.full(values.shape, np.nan, dtype=values.dtype)
+    if values.shape[0] < 2:
+        return result
+    with np.errstate(divide='ignore', invalid='ignore'):
+        steps = np.diff(times, axis=0)
+        steps = np.where(steps > 0, steps, np.nan)
+        if values.shape[0] > 2:
+            result[1:-1] = (values[2:] - values[:-2]) / (steps[1:] + steps[:-1])
+        result[0] = (values[1] - values[0]) / steps[0]
+        result[-1] = (values[-1] - values[-2]) / steps[-1]
+    return result
+
+
+def kinematic_profiles(x, y, times=None):
+    """
+    Calculate the speed and acceleration profiles of all the trials in a single pass.
+    Profiles are calculated in normalized time (the trajectory runs from 0 to 1) and, if the timestamps are given,
+    in real time (seconds).
+    :Param x, y: numpy arrays of shape (num_timepoints, num_trials), the normalized trajectories
+    :Param times: numpy array of shape (num_timepoints, num_trials) with the time of every normalized time point in
+    ms from the start of the trial, or None
+    :Return: dict of (num_timepoints, num_trials) arrays: 'speed_normalized', 'acceleration_normalized' and,
+    if times is given, 'time', 'speed' and 'acceleration'
+    """
+    normalized_time = np.linspace(0, 1, x.shape[0])
+    speed = np.sqrt(derivative(x, normalized_time) ** 2 + derivative(y, normalized_time) ** 2)
+    profiles = {'speed_normalized': speed, 'acceleration_normalized': derivative(speed, normalized_time)}
+    if times is not None:
+        seconds = times / 1000
+        speed = np.sqrt(derivative(x, seconds) ** 2 + derivative(y, seconds) ** 2)
+        profiles.update(time=times, speed=speed, acceleration=derivative(speed, seconds))
+    return profiles
+
+
+def nan_max(values):
+    """
+    Maximum of every column, ignoring NaN (NaN for columns without valid values).
+    """
+    valid = ~np.isnan(values).all(axis=0)
+    result = np.full(values.shape[1], np.nan)
+    result[valid] = np.nanmax(values[:, valid], axis=0)
+    return result
+
+
+def nan_argmax(values):
+    """
+    Time point of the maximum of every column, ignoring NaN (-1 for columns without valid values).
+    """
+    valid = ~np.isnan(values).all(axis=0)
+    return np.where(valid, np.argmax(np.where(np.isnan(values), -np.inf, values), axis=0), -1)
+
+
+def movement_initiation_index(x, y):
+    """
+    Return, for every trial, the last normalized time point before the cursor first leaves its start position
+    (-1 if the cursor never moves).
+    """
+    moved = (x != x[0, :]) | (y != y[0, :])
+    first_move = np.argmax(moved, axis=0)
+    return np.where(moved.any(axis=0), first_move - 1, -1)
+
+
+def time_at(times, indices):
+    """
+    Value of `times` at the time point `indices` of every trial (NaN where the index is -1).
+    """
+    trials = np.arange(times.shape[1])
+    values = times[np.maximum(indices, 0), trials].astype(np.float64)
+    values[indices < 0] = np.nan
+    return values
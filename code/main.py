@@ -1,13 +1,20 @@
 import os
 from Visualization import Visualization
-from datetime import date
-from process_across_subjects import process_across_subjects
+from output_formats import unified_dataset_path
+from process_across_subjects import process_across_subjects, process_export
 
 # Define Global Variables
 
 # Set directory to be the parent directory of the current file
 DIRECTORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # Alternatively, define your own path
 
+# Single-file exports (optional): if the whole study is exported as one CSV file with a participant column, instead of
+# one file per subject in the data folder, set its path and the participant column. The file is read in chunks of
+# EXPORT_CHUNK_SIZE rows and split into one file per participant, so memory stays bounded for very large exports.
+EXPORT_FILE = ''  # e.g. DIRECTORY + os.sep + 'study_export.csv'
+PARTICIPANT_COLUMN = ''  # e.g. 'ProlificID'
+EXPORT_CHUNK_SIZE = 100000
+
 # Choose how to handle practice trials:
 # - 'auto'   → remove rows where 'test_part' starts with 'practice'
 # - 'manual' → remove the first NUM_PRACTICE_TRIALS trajectories and keep NUM_TRIALS
@@ -15,6 +22,60 @@ PRACTICE_MODE = 'manual'
 NUM_PRACTICE_TRIALS = 2   # Only used when PRACTICE_MODE == 'manual'
 NUM_TRIALS = 66            # Only used when PRACTICE_MODE == 'manual'. 0 = keep all remaining trials
 
+# Choose how to calculate the maximal deviation:
+# - 'exact'   → closed-form distance from each point to the straight line
+# - 'sampled' → legacy approximation (nearest of NUM_TIMEPOINTS points on the line), reproduces older results
+MAX_DEVIATION_METHOD = 'exact'
+
+# Number of time points of the normalized trajectories. Fewer points (e.g. 21) make quick screening runs faster
+# and smaller, more points give a finer resolution. Saved in the output metadata, so visualization follows it.
+NUM_TIMEPOINTS = 101
+
+# Float type of the normalized coordinates and measures: 'float64' (default) or 'float32'.
+# 'float32' halves memory use and the size of the stored coordinates, with differences of about 1e-6.
+COORDINATES_DTYPE = 'float64'
+
+# Measures to calculate. Leave empty to calculate all of them:
+# 'flips', 'max_deviation', 'RPB', 'AUC', 'initiation_angle', 'initiation_correspondence',
+# 'trajectory_length', 'real_min_length',
+# and with TIME_COLUMN: 'peak_velocity', 'peak_velocity_time', 'peak_acceleration', 'movement_initiation_time',
+# 'peak_velocity_normalized', 'peak_velocity_timepoint'
+MEASURES_TO_CALCULATE = []  # e.g. ['AUC', 'max_deviation']
+
+# Modules (or .py files) with custom measures registered with measures.register_measure.
+# Their measures are added as extra columns. See custom_measures_example.py.
+MEASURE_PLUGINS = []  # e.g. ['custom_measures_example']
+
+# Number of processes used to preprocess the subject files in parallel.
+# 1 = process one subject at a time, 0 = use all available cores.
+NUM_WORKERS = 1
+
+# Format of the unified output file:
+# - 'csv'               → one wide CSV file with the x_*/y_* coordinate columns
+# - 'parquet'/'feather' → a columnar table plus binary coordinate arrays (_x.npy, _y.npy), faster and smaller.
+#                         Requires the pyarrow package.
+OUTPUT_FORMAT = 'csv'
+# Only for 'parquet'/'feather': memory-map the coordinate arrays when plotting instead of loading them to RAM
+MEMORY_MAP_COORDINATES = False
+
+# Keep the result of each subject in output/cache and only preprocess new or changed files on the next run.
+# Delete the cache folder after changing the preprocessing code. Entries of removed or changed files are deleted.
+USE_CACHE = False
+
+# Write every subject to the unified CSV file as soon as it is processed instead of merging all subjects in memory.
+# Use for very large studies ('csv' output format only). The columns of the unified file are those of the first
+# subject, so every subject file must have the columns of the first one (extra columns raise an error).
+STREAM_OUTPUT = False
+
+# Profiling (optional): save the time/memory of every preprocessing stage of every subject to a report,
+# e.g. 'profile_report.json' or 'profile_report.csv' (saved in the output folder), and/or cProfile dumps
+# of every subject to a 'profiles' folder. Leave empty to disable.
+PROFILE_REPORT = ''
+PROFILE_DIRECTORY = ''
+# Trace the memory of every stage. The tracing overhead is included in the reported times, set to False for timings
+# comparable with unprofiled runs (the report then has no peak memory)
+PROFILE_MEMORY = True
+
 
 # Set column names
 X_CORD_COLUMN = 'x_cord'  # The name of the column of x coordinates
@@ -22,11 +83,24 @@ Y_CORD_COLUMN = 'y_cord'  # The name of the column of y coordinates
 FIRST_CONDITION_COLUMN = 'trajectory'  # Optional, name of the column describe the experimental factor
 SECOND_CONDITION_COLUMN = ''  # Optional, name of the column describe an experimental condition of second order
 RESPONSE_COLUMN = 'response' #optional, name of the column with the difficulty slider
+TIME_COLUMN = ''  # Optional, name of the column of sample timestamps (e.g. 'time_cord'), enables kinematic measures
+
+# Choice ranking (optional): add the columns of rank_choices.py (choice_rank_string, choice_is_higher_ranked,
+# choice_is_one_more, total_one_more_true) to the unified file while the subject files are loaded,
+# instead of running rank_choices.py as a separate pass. Needs the Left_option, Right_option and choice columns.
+RANK_CHOICES = False
+RANK_PRACTICE_TRIALS = 2  # Number of leading non-blank 'choice' rows treated as practice by the ranking
+RANK_SEED = None  # Integer for a reproducible tie-break between items chosen equally often (as --seed of rank_choices.py)
 
 # Columns to preserve even if they don't have trajectory data
 # These rows will have NaN for trajectory measures but keep their original data
 COLUMNS_TO_PRESERVE = []  # e.g., ['trial_type', 'response', 'rt', 'attention_check']
 
+# Columns of the subject files to carry into the unified file (optional). If set, only these columns, the condition
+# columns and the columns used by the preprocessing (coordinates, time, response, preserved and 'test_part') are read,
+# which makes loading wide exports much faster. None keeps all the columns.
+COLUMNS_TO_KEEP = None  # e.g., ['rt', 'trial_index', 'choice']
+
 # Custom labels for conditions (optional). If not provided, the condition values will be used as labels.
 CONDITION_LABELS = {
     FIRST_CONDITION_COLUMN: {
@@ -51,6 +125,12 @@ COLORMAP = [(205, 92, 92), (0, 206, 209)]  # Colors for different conditions (RG
 
 # Parameters for additional visualization options
 SUBJECT_TO_INSPECT = 1  # Integer, subject ID to plot. If 0, will not plot specific subject.
+SAVE_SUBJECT_MEANS = False  # Save the mean trajectory of every subject in every condition to 'Subject means.csv'
+# Quality-control report with the trajectories of every subject, e.g. 'Subject report.pdf' or 'Subject report.html'
+# (saved in the output folder, rendered over NUM_WORKERS processes). Leave empty to skip.
+SUBJECT_REPORT = ''
+# Render without a display (e.g. on a server or in batch runs): figures are saved but not shown
+HEADLESS = False
 
 
 #TODO
@@ -70,23 +150,42 @@ if __name__ == "__main__":
         data_directory = DIRECTORY
         output_directory = os.path.dirname(DIRECTORY)  # Parent directory of data folder
 
+    vis_path = unified_dataset_path(output_directory, OUTPUT_FORMAT)
+    cache_directory = output_directory + os.sep + 'cache' if USE_CACHE else None
+    profile_report = output_directory + os.sep + PROFILE_REPORT if PROFILE_REPORT else None
+    profile_directory = output_directory + os.sep + PROFILE_DIRECTORY if PROFILE_DIRECTORY else None
+    columns_to_keep = None
+    if COLUMNS_TO_KEEP is not None:
+        columns_to_keep = list(COLUMNS_TO_KEEP) + [FIRST_CONDITION_COLUMN, SECOND_CONDITION_COLUMN,
+                                                   PARTICIPANT_COLUMN if EXPORT_FILE else '']
     if PREPROCESS:
-        process_across_subjects(data_directory, output_directory,
-                                X_CORD_COLUMN, Y_CORD_COLUMN,
-                                RESPONSE_COLUMN, COLUMNS_TO_PRESERVE,
-                                PRACTICE_MODE, NUM_PRACTICE_TRIALS, NUM_TRIALS)
+        processing_args = (X_CORD_COLUMN, Y_CORD_COLUMN,
+                           RESPONSE_COLUMN, COLUMNS_TO_PRESERVE,
+                           PRACTICE_MODE, NUM_PRACTICE_TRIALS, NUM_TRIALS,
+                           MAX_DEVIATION_METHOD, NUM_WORKERS, OUTPUT_FORMAT,
+                           cache_directory, STREAM_OUTPUT, profile_report, profile_directory,
+                           MEASURES_TO_CALCULATE, MEASURE_PLUGINS, TIME_COLUMN,
+                           NUM_TIMEPOINTS, COORDINATES_DTYPE,
+                           RANK_CHOICES, RANK_PRACTICE_TRIALS, RANK_SEED, columns_to_keep, PROFILE_MEMORY)
+        if EXPORT_FILE:
+            vis_path = process_export(EXPORT_FILE, PARTICIPANT_COLUMN, output_directory, *processing_args,
+                                      chunk_size=EXPORT_CHUNK_SIZE)
+        else:
+            vis_path = process_across_subjects(data_directory, output_directory, *processing_args)
 
     if ALTERNATIVE_VIS_PATH:
         vis_path = ALTERNATIVE_VIS_PATH
-    else:
-        vis_path = output_directory + os.sep + 'all_subjects_processed' + str(date.today()) + '.csv'
     viz = Visualization(vis_path, output_directory,
                         STUDY_TITLE,
                         FIRST_CONDITION_COLUMN, FIRST_CONDITION_ORDER, SECOND_CONDITION_COLUMN, SECOND_CONDITION_ORDER,
                         TITLE_SIZE, LABELS_SIZE, TICKS_SIZE, LEGEND_SIZE, POINT_SIZE,COLORMAP,
-                        SUBJECT_TO_INSPECT, [], CONDITION_LABELS)
+                        SUBJECT_TO_INSPECT, [], CONDITION_LABELS, MEMORY_MAP_COORDINATES, HEADLESS)
     viz.plot_means()  # plots the mean of the experiment
     viz.plot_subject()  # plots all trajectories of the subject defined for inspection
+    if SAVE_SUBJECT_MEANS:
+        viz.save_subject_means()
+    if SUBJECT_REPORT:
+        viz.save_subject_report(output_directory + os.sep + SUBJECT_REPORT, NUM_WORKERS)
 
     #TODO
     # viz.examine_certain_trajectory()
@@ -0,0 +1,172 @@
+"""
+Registry of the trajectory measures that Preprocessing can calculate.
+
+Every measure is a function over the whole trajectory matrices of a subject:
+    function(x, y, context) -> array with one value per trajectory trial
+where x and y have shape (NUM_TIMEPOINTS, num_trials) and context is a dict with the processing parameters
+('num_timepoints', 'normalized_x', 'normalized_y', 'max_deviation_method', 'point_of_angle') and the values
+of the measures listed in `requires`.
+`requires` may also name the preprocessing stages that must be applied to x and y first
+('normalize', 'rescale' or 'remap'; each stage implies the ones before it), 'kinematics' to receive the speed and
+acceleration profiles of the trials in context['kinematics'] (see kinematics.kinematic_profiles), and 'timestamps'
+for measures that need the real time of the samples (only available when a time column is given).
+Measures that require 'kinematics' or 'timestamps' are only calculated by default when a time column is given.
+
+Custom measures are added the same way, in a separate module (plugin) that is loaded with load_measure_plugins
+(MEASURE_PLUGINS in main.py). They are calculated together with the built-in measures and written as extra
+columns after them. See custom_measures_example.py.
+"""
+import importlib
+import importlib.util
+import os
+import sys
+import numpy as np
+from collections import OrderedDict, namedtuple
+from trajectory_engine import (x_flips, returns_to_point_of_balance, area_under_curve, initiation_angle,
+                               trajectory_length, straight_line_length, max_deviation, max_deviation_sampled)
+from kinematics import nan_max, nan_argmax, movement_initiation_index, time_at
+
+STAGES = ('normalize', 'rescale', 'remap')
+KINEMATICS = 'kinematics'
+TIMESTAMPS = 'timestamps'
+
+Measure = namedtuple('Measure', ['name', 'function', 'requires'])
+
+# name -> Measure, in the order of the output columns
+MEASURES = OrderedDict()
+
+
+def register_measure(name, requires=('remap',)):
+    """
+    Decorator that adds a measure function to the registry.
+    :Param name: str, name of the measure (also the name of its output column)
+    :Param requires: preprocessing stages and/or other measures that the measure depends on
+    """
+    def decorator(function):
+        if name in MEASURES and _qualified_name(MEASURES[name].function) != _qualified_name(function):
+            raise ValueError("A measure named '" + name + "' is already registered by " +
+                             _qualified_name(MEASURES[name].function))
+        MEASURES[name] = Measure(name, function, tuple(requires))
+        return function
+    return decorator
+
+
+def _qualified_name(function):
+    return function.__module__ + '.' + function.__qualname__
+
+
+def load_measure_plugins(plugins):
+    """
+    Import the modules that register custom measures, so that the measures are added to the registry.
+    Modules that were already imported are not imported again.
+    :Param plugins: list of module names (importable from the code folder or the python path) or .py file paths
+    :Return: list of the module objects
+    """
+    modules = []
+    for plugin in plugins or []:
+        if plugin.endswith('.py'):
+            module_name = os.path.splitext(os.path.basename(plugin))[0]
+            if module_name not in sys.modules:
+                spec = importlib.util.spec_from_file_location(module_name, plugin)
+                module = importlib.util.module_from_spec(spec)
+                sys.modules[module_name] = module
+                spec.loader.exec_module(module)
+            modules.append(sys.modules[module_name])
+        else:
+            modules.append(importlib.import_module(plugin))
+    return modules
+
+
+def resolve_measures(names=None, timestamps=False):
+    """
+    Returns the list of measure names to calculate: all the registered measures if `names` is empty
+    (without the kinematic measures, unless timestamps is True), otherwise `names` after checking that they are
+    registered.
+    :Param timestamps: bool, whether the data has a time column
+    """
+    if not names:
+        return [name for name, measure in MEASURES.items()
+                if timestamps or not {KINEMATICS, TIMESTAMPS} & set(measure.requires)]
+    unknown = [name for name in names if name not in MEASURES]
+    if unknown:
+        raise ValueError("Unknown measures " + str(unknown) + ", available measures are " + str(list(MEASURES)))
+    return list(names)
+
+
+@register_measure('flips', requires=('remap',))
+def flips(x, y, context):
+    return x_flips(x)
+
+
+@register_measure('max_deviation', requires=('remap',))
+def maximal_deviation(x, y, context):
+    if context['max_deviation_method'] == 'sampled':
+        return max_deviation_sampled(x, y)
+    return max_deviation(x, y)
+
+
+@register_measure('RPB', requires=('remap',))
+def RPB(x, y, context):
+    return returns_to_point_of_balance(x)
+
+
+@register_measure('AUC', requires=('remap',))
+def AUC(x, y, context):
+    # integrate on the distance between the actual trajectory and a straight line
+    # from (0,0) to the normalized location (default and recommended - 1,1.5).
+    return area_under_curve(x, y, context['normalized_y'])
+
+
+@register_measure('initiation_angle', requires=('remap',))
+def angle(x, y, context):
+    return initiation_angle(x, y, context['point_of_angle'])
+
+
+@register_measure('initiation_correspondence', requires=('initiation_angle',))
+def initiation_correspondence(x, y, context):
+    return context['initiation_angle'] < 90
+
+
+@register_measure('trajectory_length', requires=('remap',))
+def length(x, y, context):
+    return trajectory_length(x, y)
+
+
+@register_measure('real_min_length', requires=('remap',))
+def real_min_length(x, y, context):
+    return straight_line_length(x, y)
+
+
+# kinematic measures, see kinematics.py. Real time is in ms from the start of the trial,
+# velocity is in normalized units per second (or per trajectory in normalized time)
+
+@register_measure('peak_velocity', requires=('remap', KINEMATICS, TIMESTAMPS))
+def peak_velocity(x, y, context):
+    return nan_max(context[KINEMATICS]['speed'])
+
+
+@register_measure('peak_velocity_time', requires=('remap', KINEMATICS, TIMESTAMPS))
+def peak_velocity_time(x, y, context):
+    profiles = context[KINEMATICS]
+    return time_at(profiles['time'], nan_argmax(profiles['speed']))
+
+
+@register_measure('peak_acceleration', requires=('remap', KINEMATICS, TIMESTAMPS))
+def peak_acceleration(x, y, context):
+    return nan_max(context[KINEMATICS]['acceleration'])
+
+
+@register_measure('movement_initiation_time', requires=('remap', KINEMATICS, TIMESTAMPS))
+def movement_initiation_time(x, y, context):
+    return time_at(context[KINEMATICS]['time'], movement_initiation_index(x, y))
+
+
+@register_measure('peak_velocity_normalized', requires=('remap', KINEMATICS))
+def peak_velocity_normalized(x, y, context):
+    return nan_max(context[KINEMATICS]['speed_normalized'])
+
+
+@register_measure('peak_velocity_timepoint', requires=('remap', KINEMATICS))
+def peak_velocity_timepoint(x, y, context):
+    timepoints = nan_argmax(context[KINEMATICS]['speed_normalized'])
+    return np.where(timepoints < 0, np.nan, timepoints)
@@ -0,0 +1,195 @@
+import json
+import numpy as np
+import pandas as pd
+import os
+from datetime import date
+
+# 'csv'             → a single wide CSV file with the x_0..x_N / y_0..y_N coordinate columns (default)
+# 'parquet'/'feather' → a columnar table with the data and measures, and the coordinates stored next to it
+#                     as two binary float arrays: <name>_x.npy and <name>_y.npy (requires pyarrow)
+OUTPUT_FORMATS = ('csv', 'parquet', 'feather')
+
+
+def check_output_format(output_format):
+    """
+    Raises an error if the output format is unknown, or if it is a columnar format and the optional pyarrow
+    package is not installed, so that a run does not fail only when the unified dataset is written.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError("output_format must be one of " + str(OUTPUT_FORMATS) + ", got " + repr(output_format))
+    if output_format != 'csv':
+        try:
+            import pyarrow  # noqa: F401 (optional dependency of the columnar formats)
+        except ImportError:
+            raise ImportError("The '" + output_format + "' output format requires the pyarrow package "
+                              "(pip install pyarrow), or use the 'csv' output format")
+
+
+def unified_dataset_path(output_directory, output_format='csv', run_date=None):
+    """
+    Returns the path of the unified dataset file for the given output format.
+    """
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError("output_format must be one of " + str(OUTPUT_FORMATS) + ", got " + repr(output_format))
+    run_date = run_date or date.today()
+    return output_directory + os.sep + 'all_subjects_processed' + str(run_date) + '.' + output_format
+
+
+def coordinates_paths(path):
+    """
+    Returns the paths of the x and y coordinate arrays stored next to a columnar unified dataset.
+    """
+    base = os.path.splitext(path)[0]
+    return base + '_x.npy', base + '_y.npy'
+
+
+def metadata_path(path):
+    """
+    Returns the path of the JSON metadata file stored next to a unified dataset
+    (number of time points and the processing parameters of the run).
+    """
+    return os.path.splitext(path)[0] + '_metadata.json'
+
+
+def write_metadata(path, x, metadata=None):
+    """
+    This function saves the metadata of a unified dataset: the number of time points of its coordinates
+    and the given processing parameters.
+    """
+    metadata = dict(metadata or {}, num_timepoints=int(x.shape[0]))
+    with open(metadata_path(path), 'w') as f:
+        json.dump(metadata, f, indent=2, default=str)
+
+
+def read_metadata(path):
+    """
+    Returns the metadata dict of a unified dataset, or an empty dict for files written without metadata.
+    """
+    if not os.path.exists(metadata_path(path)):
+        return {}
+    with open(metadata_path(path)) as f:
+        return json.load(f)
+
+
+def _csv_num_timepoints(path):
+    """
+    Count the x_ coordinate columns in the header of a unified CSV file (files written without metadata).
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    return int(sum(column.startswith('x_') and column[2:].isdigit() for column in header))
+
+
+def _to_columnar_table(df):
+    """
+    Columnar formats need a single type per column: object columns that mix types
+    (e.g. numbers in some subjects and text in others) are stored as text.
+    """
+    df = df.reset_index(drop=True)
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+    return df
+
+
+def write_unified_dataset(df, x, y, path, metadata=None):
+    """
+    This function writes the unified dataset of all subjects, and its metadata (see write_metadata).
+    :Param df: data frame with one row per trial (data and measures)
+    :Param x, y: numpy arrays of shape (NUM_TIMEPOINTS, num_rows) with the normalized coordinates of each row
+    :Param path: output path, its extension selects the format (see OUTPUT_FORMATS)
+    :Param metadata: dict of processing parameters to save in the metadata file
+    """
+    output_format = os.path.splitext(path)[1].lstrip('.')
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError("Unknown output format for " + path + ", expected one of " + str(OUTPUT_FORMATS))
+    write_metadata(path, x, metadata)
+    if output_format == 'csv':
+        big_x = pd.DataFrame(np.transpose(x)).add_prefix('x_')
+        big_y = pd.DataFrame(np.transpose(y)).add_prefix('y_')
+        df = pd.concat([df.reset_index(drop=True), big_x, big_y], axis=1)
+        df.to_csv(path)
+        return
+
+    table = _to_columnar_table(df)
+    if output_format == 'parquet':
+        table.to_parquet(path, index=False)
+    else:
+        table.to_feather(path)
+    # one row per trial, so the coordinates of each trial are contiguous on disk
+    x_path, y_path = coordinates_paths(path)
+    np.save(x_path, np.ascontiguousarray(np.transpose(x)))
+    np.save(y_path, np.ascontiguousarray(np.transpose(y)))
+
+
+def read_unified_dataset(path, num_timepoints=None, columns=None, memory_map=False):
+    """
+    This function reads a unified dataset written by write_unified_dataset, in any of the output formats.
+    :Param num_timepoints: int | None, number of time points of the coordinates. By default it is read from the
+    metadata file, or from the coordinate columns/arrays of files written without metadata
+    :Param columns: list of table columns to load, or None to load all of them
+    :Param memory_map: bool, for the columnar formats, memory-map the coordinate arrays instead of reading them,
+    so that only the trials that are actually indexed are paged in from disk
+    :Return: (df, x, y) where df holds the data and measures and x, y are numpy arrays of shape
+    (num_timepoints, num_rows), of the float type the coordinates were saved with.
+    The index of df is the row position in the file.
+    """
+    output_format = os.path.splitext(path)[1].lstrip('.')
+    if output_format == 'parquet':
+        df = pd.read_parquet(path, columns=columns)
+    elif output_format == 'feather':
+        df = pd.read_feather(path, columns=columns)
+    else:  # csv
+        metadata = read_metadata(path)
+        num_timepoints = num_timepoints or metadata.get('num_timepoints') or _csv_num_timepoints(path)
+        dtype = metadata.get('dtype', 'float64')
+        columns_x = ['x_' + str(i) for i in range(num_timepoints)]
+        columns_y = ['y_' + str(i) for i in range(num_timepoints)]
+        usecols = None if columns is None else list(columns) + columns_x + columns_y
+        df = pd.read_csv(path, index_col=None, header=0, usecols=usecols,
+                         dtype={column: dtype for column in columns_x + columns_y})
+        x = np.transpose(df[columns_x].to_numpy())
+        y = np.transpose(df[columns_y].to_numpy())
+        return df.drop(columns=columns_x + columns_y), x, y
+
+    mmap_mode = 'r' if memory_map else None
+    x_path, y_path = coordinates_paths(path)
+    return df, np.transpose(np.load(x_path, mmap_mode=mmap_mode)), np.transpose(np.load(y_path, mmap_mode=mmap_mode))
+
+
+class StreamingCSVWriter(object):
+    """
+    This class appends the rows of one subject at a time to a unified CSV file, so the whole study never has to be
+    held in memory. The written file has the same layout as write_unified_dataset(..., 'csv').
+    The columns are fixed by the first subject: columns missing in later subjects are left empty, and columns that
+    only appear in later subjects cannot be added to the header, so they raise a ValueError
+    (process_across_subjects checks the headers of the subject files before streaming).
+    :Param path: path of the output CSV file (overwritten)
+    :Param metadata: dict of processing parameters to save in the metadata file (see write_metadata)
+    """
+    def __init__(self, path, metadata=None):
+        self.path = path
+        self.metadata = metadata
+        self.columns = None
+        self.num_rows = 0
+
+    def write(self, df, x, y):
+        """
+        Append the rows of a subject.
+        :Param df: the subject data frame (data and measures), including the subject_id column
+        :Param x, y: numpy arrays of shape (NUM_TIMEPOINTS, num_rows) with the normalized coordinates of each row
+        """
+        rows = df.reset_index()
+        if self.columns is None:
+            self.columns = list(rows.columns)
+            write_metadata(self.path, x, self.metadata)
+        else:
+            extra_columns = [column for column in rows.columns if column not in self.columns]
+            if extra_columns:
+                raise ValueError("Columns " + str(extra_columns) + " are not present in the first subject and cannot "
+                                 "be added to the streamed file " + self.path + ", merge without streaming instead")
+            rows = rows.reindex(columns=self.columns)
+        rows = pd.concat([rows,
+                          pd.DataFrame(np.transpose(x)).add_prefix('x_'),
+                          pd.DataFrame(np.transpose(y)).add_prefix('y_')], axis=1)
+        rows.index = pd.RangeIndex(self.num_rows, self.num_rows + rows.shape[0])
+        rows.to_csv(self.path, mode='w' if self.num_rows == 0 else 'a', header=self.num_rows == 0)
+        self.num_rows += rows.shape[0]
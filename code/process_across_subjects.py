@@ -1,16 +1,220 @@
 import numpy as np
 import pandas as pd
 import os
-from Preprocessing import Preprocessing
-from datetime import date
+import tempfile
+from collections import deque
+from itertools import islice
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from Preprocessing import Preprocessing, RANK_PRACTICE_TRIALS
+from rank_choices import file_seed
+from export_reader import split_export
+from output_formats import check_output_format, unified_dataset_path, write_unified_dataset, StreamingCSVWriter
+from measures import resolve_measures, load_measure_plugins
+from profiling import SubjectProfiler, no_stage, write_profile_report
+from result_cache import file_hash, cache_key, is_cached, load_cached_result, save_cached_result, prune_cache
+
+
+def is_subject_file(file_name):
+    """
+    Returns True if the file in the data directory is a subject CSV file
+    (and not a unified output file or a system file).
+    """
+    return (file_name[0:3] != 'all' and
+            file_name != '.DS_Store' and
+            file_name != '.gitkeep' and
+            file_name.endswith('.csv'))
+
+
+def list_subject_files(data_directory):
+    """
+    Returns the subject CSV files of the data directory sorted by file name,
+    so that subject ids do not depend on the order in which the file system lists the files.
+    """
+    return sorted(file_name for file_name in os.listdir(data_directory) if is_subject_file(file_name))
+
+
+def process_subject(path, x_cord_column, y_cord_column, response_column = "", columns_to_preserve = [],
+                    practice_mode='auto', num_practice_trials=0, num_trials=None,
+                    max_deviation_method='exact', measures=None, measure_plugins=None, time_column="",
+                    num_timepoints=Preprocessing.NUM_TIMEPOINTS, dtype='float64', rank_choices=False,
+                    rank_practice_trials=RANK_PRACTICE_TRIALS, rank_seed=None, columns_to_keep=None, profiler=None):
+    """
+    This function runs the preprocessing pipeline on a single subject file.
+    It is defined at module level so that it can be sent to worker processes.
+    :Param measures: list of measure names to calculate (see measures.MEASURES), None or empty for all measures
+    :Param measure_plugins: list of modules that register custom measures (see measures.load_measure_plugins),
+    loaded here too so that worker processes know the custom measures
+    :Param time_column: optional column name containing the timestamps of the samples (for the kinematic measures)
+    :Param num_timepoints: int, number of time points of the normalized trajectories
+    :Param dtype: str, 'float64' or 'float32', float type of the coordinates and measures
+    :Param rank_choices: bool, add the choice ranking columns of rank_choices.py while the file is loaded
+    :Param rank_practice_trials: int, number of leading non-blank 'choice' rows treated as practice by the ranking
+    :Param rank_seed: int | numpy SeedSequence | None, seed of the tie-break between items chosen equally often
+    :Param columns_to_keep: list | None, extra columns to read; if given, the other unused columns are not parsed
+    :Param profiler: profiling.SubjectProfiler | None, records the time and memory of every stage
+    :Return: (df, x_full, y_full), the subject data frame with all measures and its coordinate arrays
+    (NaN for non-trajectory rows)
+    """
+    print("currently processing ", "subject :", os.path.basename(path))
+    load_measure_plugins(measure_plugins)
+    stage = profiler.stage if profiler else no_stage
+    cur_class = Preprocessing(
+        path,
+        x_cord_column,
+        y_cord_column,
+        response_column,
+        columns_to_preserve,
+        practice_mode,
+        num_practice_trials,
+        num_trials,
+        max_deviation_method,
+        time_column,
+        num_timepoints,
+        dtype,
+        rank_choices,
+        rank_practice_trials,
+        rank_seed,
+        columns_to_keep,
+        stage
+    )
+    trials = int(cur_class.num_trajectory_rows)
+    # preprocess
+    if cur_class.isOK:
+        with stage('normalize_time_points', trials=trials):
+            cur_class.normalize_time_points()
+        with stage('rescale', trials=trials):
+            cur_class.rescale()
+        with stage('remap_trajectories', trials=trials):
+            cur_class.remap_trajectories()
+    with stage('calculate_all_measures', trials=trials):
+        cur_class.calculate_all_measures(measures)
+
+    # Get coordinate arrays that match dataframe shape (NaN for non-trajectory rows)
+    with stage('get_coordinate_arrays', rows=int(cur_class.df.shape[0])):
+        x_full, y_full = cur_class.get_coordinate_arrays()
+    return cur_class.df, x_full, y_full
+
+
+def file_rank_seeds(paths, seed):
+    """
+    Returns the seed of the ranking tie-break of every subject file, as a dict path -> {'rank_seed': SeedSequence}.
+    Every file gets its own seed spawned from the seed by its file name (see rank_choices.file_seed), like
+    rank_choices.process_folder, so the ranking columns match the standalone script run on the same folder
+    and do not change when other files are added or removed.
+    """
+    return {path: {'rank_seed': file_seed(seed, os.path.basename(path))} for path in paths}
+
+
+def run_subject(path, options, profile=False, profile_directory=None, file_options=None, profile_memory=True):
+    """
+    Runs process_subject on a subject file, with the processing options given as a dict.
+    :Param file_options: dict | None, path -> dict of options of that file only, overriding `options`
+    :Param profile_memory: bool, trace the memory of the profiled stages (see profiling.SubjectProfiler)
+    :Return: (result, records), where records is the list of stage records of the subject if profile is True,
+    else None
+    """
+    options = dict(options, **(file_options or {}).get(path, {}))
+    if not profile:
+        return process_subject(path, **options), None
+    profiler = SubjectProfiler(os.path.basename(path), profile_directory, profile_memory)
+    result = profiler.run(process_subject, path, profiler=profiler, **options)
+    return result, profiler.records
+
+
+def bounded_map(executor, function, items, window):
+    """
+    Like executor.map, yields function(item) for every item in order, but keeps at most `window` items submitted
+    and not yet yielded, so that the finished results waiting for their turn do not pile up in memory.
+    """
+    items = iter(items)
+    pending = deque(executor.submit(function, item) for item in islice(items, window))
+    while pending:
+        result = pending.popleft().result()
+        for item in islice(items, 1):
+            pending.append(executor.submit(function, item))
+        yield result
+
+
+def iter_subject_results(paths, run, num_workers=1, cache_directory=None, cache_parameters=None,
+                         file_cache_parameters=None):
+    """
+    This generator yields (result, records) for every subject file, in the order of `paths`, where result is the
+    processing result (df, x_full, y_full) and records the profiling records (None if not profiled or cached).
+    Cached results are loaded one at a time when their turn comes, the other files are processed with `run`
+    (see run_subject; in parallel if num_workers > 1) and added to the cache.
+    In parallel, at most 2 * num_workers files are in flight (being processed or waiting for their turn),
+    so memory stays bounded by a few subjects.
+    Cache entries that are not used by any of the files (older versions of the files or other parameters)
+    are removed from the cache directory.
+    :Param file_cache_parameters: dict | None, path -> dict of parameters of that file only, added to its cache key
+    """
+    keys = [None] * len(paths)
+    if cache_directory:
+        file_cache_parameters = file_cache_parameters or {}
+        keys = [cache_key(path, dict(cache_parameters, **file_cache_parameters.get(path, {}))) for path in paths]
+    cached = [bool(cache_directory) and is_cached(cache_directory, key) for key in keys]
+    to_process = [path for path, is_in_cache in zip(paths, cached) if not is_in_cache]
+    if cache_directory:
+        print("found cached results for", len(paths) - len(to_process), "of", len(paths), "subjects")
+        num_removed = prune_cache(cache_directory, keys)
+        if num_removed:
+            print("removed", num_removed, "unused cache entries")
+
+    if not num_workers:
+        num_workers = os.cpu_count() or 1
+    num_workers = min(num_workers, max(len(to_process), 1))
+    executor = ProcessPoolExecutor(max_workers=num_workers) if num_workers > 1 else None
+    try:
+        # results are yielded in the order of the files, each as soon as it and the files before it are ready
+        new_results = bounded_map(executor, run, to_process, 2 * num_workers) if executor else map(run, to_process)
+        for key, is_in_cache in zip(keys, cached):
+            if is_in_cache:
+                yield load_cached_result(cache_directory, key), None
+                continue
+            result, records = next(new_results)
+            if cache_directory:
+                save_cached_result(cache_directory, key, result)
+            yield result, records
+    finally:
+        if executor:
+            executor.shutdown(cancel_futures=True)
+
+
+def check_streamed_columns(paths, columns_to_keep=None):
+    """
+    The streamed unified file takes its columns from the first subject (see output_formats.StreamingCSVWriter).
+    Raises a ValueError before any subject is processed if a later subject file has columns (among those that are
+    kept) that the first one does not have, since they could not be written.
+    """
+    if not paths:
+        return
+    first_columns = set(pd.read_csv(paths[0], nrows=0).columns)
+    for path in paths[1:]:
+        extra_columns = [column for column in pd.read_csv(path, nrows=0).columns if column not in first_columns]
+        if columns_to_keep is not None:
+            extra_columns = [column for column in extra_columns if column in columns_to_keep]
+        if extra_columns:
+            raise ValueError("The subject file " + path + " has columns " + str(extra_columns) + " that the first "
+                             "subject file " + paths[0] + " does not have. The streamed unified file takes its "
+                             "columns from the first subject, use stream_output=False to merge these files")
+
+
 def process_across_subjects(data_directory,output_directory, x_cord_column,y_cord_column,
                             response_column = "", columns_to_preserve = [],
-                            practice_mode='auto', num_practice_trials=0, num_trials=None):
+                            practice_mode='auto', num_practice_trials=0, num_trials=None,
+                            max_deviation_method='exact', num_workers=1, output_format='csv',
+                            cache_directory=None, stream_output=False, profile_report=None,
+                            profile_directory=None, measures=None, measure_plugins=None, time_column="",
+                            num_timepoints=Preprocessing.NUM_TIMEPOINTS, dtype='float64', rank_choices=False,
+                            rank_practice_trials=RANK_PRACTICE_TRIALS, rank_seed=None, columns_to_keep=None,
+                            profile_memory=True):
     """
     This function receives a directory and apply the functions in the above class to all the subjects files in the directory.
-    It also creates a unified CSV file of all subjects and saves it in the output directory.
+    It also creates a unified file of all subjects and saves it in the output directory.
     Practice trials can be removed automatically via the 'test_part' column or manually via the
     `num_practice_trials`/`num_trials` parameters.
+    Subjects are numbered by the sorted file names, so the unified file is identical for any number of workers.
     :Param data_directory: directory of the data files.
     :Param x_cord_column: column name containing x-coordinates
     :Param y_cord_column: column name containing y-coordinates
@@ -19,51 +223,135 @@ def process_across_subjects(data_directory,output_directory, x_cord_column,y_cor
     :Param practice_mode: str, 'auto' or 'manual' (default 'auto')
     :Param num_practice_trials: int, number of practice trials to drop when using manual mode
     :Param num_trials: int | None, number of experimental trials to keep when using manual mode
+    :Param max_deviation_method: str, 'exact' or 'sampled' (legacy approximation), default 'exact'
+    :Param num_workers: int, number of processes used to preprocess subjects in parallel.
+    1 (default) processes the subjects in the current process, 0 or None uses all available cores.
+    :Param output_format: str, 'csv' (default), 'parquet' or 'feather'. The columnar formats store the coordinates
+    as binary arrays next to the table (see output_formats).
+    :Param cache_directory: str | None, directory of the per-subject result cache. When set, only subject files
+    whose content or processing parameters changed since the last run are preprocessed again (see result_cache).
+    Entries not used by the current files and parameters are removed, so use one cache directory per study.
+    With rank_choices and no rank_seed, cached subjects keep the random tie-break of the run that cached them
+    :Param stream_output: bool, append the rows of every subject to the unified CSV file as soon as the subject is
+    processed, instead of merging all subjects in memory. Peak memory is then bounded by the largest subject
+    (by the 2 * num_workers largest subjects in parallel, see iter_subject_results).
+    The columns are fixed by the first subject (see output_formats.StreamingCSVWriter): a later subject file
+    with columns the first one does not have raises a ValueError before processing starts. csv output only.
+    :Param profile_report: str | None, path of a .json or .csv report with the wall time, CPU time, peak memory and
+    row/trial counts of every preprocessing stage of every processed subject (see profiling). Loading is split into
+    the read_csv, rank_choices, filter_rows and parse_coordinates stages
+    :Param profile_directory: str | None, directory for a cProfile dump (<subject>.prof) of every processed subject
+    :Param measures: list of measure names to calculate (see measures.MEASURES), None or empty for all measures.
+    Skipping measures that are not needed saves their processing time.
+    :Param measure_plugins: list of module names or .py files that register custom measures with
+    measures.register_measure. Their measures are calculated with the built-in ones and written as extra columns.
+    :Param time_column: optional column name containing the timestamps of the samples, serialized like the
+    coordinates. Adds the kinematic measures (peak velocity and its time, peak acceleration, movement initiation time)
+    :Param num_timepoints: int, number of time points of the normalized trajectories (default 101). It is saved with
+    the processing parameters in the metadata file of the unified dataset, which Visualization reads.
+    :Param dtype: str, 'float64' (default) or 'float32'. float32 halves the memory of the coordinate arrays and the
+    size of the stored coordinates, with differences of about 1e-6 from float64 (see Preprocessing)
+    :Param rank_choices: bool, add the columns of rank_choices.py (choice_rank_string, choice_is_higher_ranked,
+    choice_is_one_more, total_one_more_true) to the unified file, computed from the Left_option, Right_option and
+    choice columns of the already loaded subject files instead of a separate pass over the data directory
+    :Param rank_practice_trials: int, number of leading non-blank 'choice' rows of every file treated as practice
+    by the ranking (independent of practice_mode, as in rank_choices.py)
+    :Param rank_seed: int | None, seed of the tie-break between items chosen equally often in choice_rank_string.
+    Every file gets its own seed spawned from it by its file name, as in rank_choices.py,
+    so the ranking columns are the same as those of  rank_choices.py --seed  on the same folder
+    :Param columns_to_keep: list | None, columns to carry into the unified file besides the ones used by the
+    preprocessing (coordinates, time, response, preserved, ranking and 'test_part' columns). When given, the other
+    columns of the subject files are not parsed at all, which saves most of the loading time of wide exports.
+    None (default) keeps all the columns.
+    :Param profile_memory: bool, trace the memory allocations of the profiled subjects (default True). The tracing
+    overhead is included in the profiled wall and CPU times; set to False for timings comparable with unprofiled runs
+    :Return: path of the unified file
     """
-    df_list = []
-    files = os.listdir(data_directory)
-    x_list = []
-    y_list = []
-    sub_counter = 1
-    for sub in range(len(files)):
-        if (files[sub][0:3] != 'all' and 
-            files[sub] != '.DS_Store' and 
-            files[sub] != '.gitkeep' and 
-            files[sub].endswith('.csv')):
-            print("currently processing ", "subject :",files[sub] )
-            cur_class = Preprocessing(
-                data_directory + os.sep + files[sub],
-                x_cord_column,
-                y_cord_column,
-                response_column,
-                columns_to_preserve,
-                practice_mode,
-                num_practice_trials,
-                num_trials
-            )
-            # preprocess
-            if cur_class.isOK:
-                cur_class.normalize_time_points()
-                cur_class.rescale()
-                cur_class.remap_trajectories()
-            cur_class.calculate_all_measures()
-            df_list.append(cur_class.df)
-
-            # Get coordinate arrays that match dataframe shape (NaN for non-trajectory rows)
-            x_full, y_full = cur_class.get_coordinate_arrays()
+    check_output_format(output_format)
+    files = list_subject_files(data_directory)
+    paths = [data_directory + os.sep + file_name for file_name in files]
+    plugin_modules = load_measure_plugins(measure_plugins)
+    options = dict(x_cord_column=x_cord_column,
+                   y_cord_column=y_cord_column,
+                   response_column=response_column,
+                   columns_to_preserve=columns_to_preserve,
+                   practice_mode=practice_mode,
+                   num_practice_trials=num_practice_trials,
+                   num_trials=num_trials,
+                   max_deviation_method=max_deviation_method,
+                   measures=resolve_measures(measures, timestamps=bool(time_column)),
+                   measure_plugins=list(measure_plugins or []),
+                   time_column=time_column,
+                   num_timepoints=num_timepoints,
+                   dtype=dtype,
+                   rank_choices=rank_choices,
+                   rank_practice_trials=rank_practice_trials,
+                   rank_seed=rank_seed,
+                   columns_to_keep=None if columns_to_keep is None else list(columns_to_keep))
+    profile = bool(profile_report or profile_directory)
+    file_options = file_rank_seeds(paths, rank_seed) if rank_choices else None
+    run = partial(run_subject, options=options, profile=profile, profile_directory=profile_directory,
+                  file_options=file_options, profile_memory=profile_memory)
+    cache_parameters = dict(options, plugin_files=[file_hash(module.__file__) for module in plugin_modules])
+    # without a rank seed the tie-break is random anyway, so the per-file seeds are left out of the cache keys
+    file_cache_parameters = file_options if rank_seed is not None else None
+    results = iter_subject_results(paths, run, num_workers, cache_directory, cache_parameters, file_cache_parameters)
+    path = unified_dataset_path(output_directory, output_format)
+    profile_records = []
+
+    if stream_output:
+        if output_format != 'csv':
+            raise ValueError("stream_output is only supported for the 'csv' output format")
+        check_streamed_columns(paths, columns_to_keep)
+        writer = StreamingCSVWriter(path, options)
+        for sub_counter, ((cur_df, x_full, y_full), records) in enumerate(results, start=1):
+            cur_df['subject_id'] = sub_counter
+            writer.write(cur_df, x_full, y_full)
+            profile_records += records or []
+    else:
+        df_list = []
+        x_list = []
+        y_list = []
+        for sub_counter, ((cur_df, x_full, y_full), records) in enumerate(results, start=1):
+            cur_df['subject_id'] = sub_counter
+            df_list.append(cur_df)
             x_list.append(x_full)
             y_list.append(y_full)
+            profile_records += records or []
+        big_df = pd.concat(df_list)
+        big_x = np.concatenate(x_list,axis=1)
+        big_y = np.concatenate(y_list,axis=1)
+        big_df = big_df.reset_index()
 
-            cur_class.df['subject_id'] = sub_counter
-            sub_counter += 1
-    big_df = pd.concat(df_list)
-    big_x = np.concatenate(x_list,axis=1)
-    big_y = np.concatenate(y_list,axis=1)
-    big_x = pd.DataFrame(np.transpose(big_x))
-    big_y = pd.DataFrame(np.transpose(big_y))
-    big_x = big_x.add_prefix('x_')
-    big_y = big_y.add_prefix('y_')
-    big_df = big_df.reset_index()
-    big_df = pd.concat([big_df,big_x,big_y],axis = 1)
-
-    big_df.to_csv(output_directory+os.sep+'all_subjects_processed'+str(date.today())+'.csv')
+        write_unified_dataset(big_df, big_x, big_y, path, options)
+
+    if profile_report:
+        write_profile_report(profile_records, profile_report)
+    return path
+
+
+def process_export(export_path, participant_column, output_directory, x_cord_column, y_cord_column, *args,
+                   chunk_size=100000, split_directory=None, **kwargs):
+    """
+    This function processes a study exported as a single CSV file with a participant column, instead of one file
+    per subject. The export is read in chunks and split into one file per participant (see export_reader), which
+    are then processed by process_across_subjects like a data directory, so memory is bounded by the chunk size
+    and the largest participant, and the unified file is the same as with one file per participant.
+    Subjects are numbered by the sorted participant ids.
+    :Param export_path: str, path of the export CSV file
+    :Param participant_column: str, column with the participant id of every row
+    :Param chunk_size: int, number of rows of the export read at a time
+    :Param split_directory: str | None, directory where the participant files are kept (e.g. to inspect them).
+    By default they are written to a temporary directory that is removed afterwards. The result cache is keyed on
+    the file contents, so it works in both cases.
+    The other parameters are those of process_across_subjects.
+    :Return: path of the unified file
+    """
+    if split_directory:
+        split_export(export_path, participant_column, split_directory, chunk_size)
+        return process_across_subjects(split_directory, output_directory, x_cord_column, y_cord_column,
+                                       *args, **kwargs)
+    with tempfile.TemporaryDirectory(dir=output_directory) as temporary_directory:
+        split_export(export_path, participant_column, temporary_directory, chunk_size)
+        return process_across_subjects(temporary_directory, output_directory, x_cord_column, y_cord_column,
+                                       *args, **kwargs)
@@ -0,0 +1,116 @@
+import cProfile
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+import pandas as pd
+
+
+class SubjectProfiler(object):
+    """
+    This class records, for every preprocessing stage of a single subject, the wall time, CPU time,
+    peak memory allocated during the stage and the number of rows/trials/samples that were processed.
+    :Param subject: str, name of the subject (file name)
+    :Param profile_directory: str | None, if given, a cProfile dump of the whole subject is saved there
+    as <subject>.prof (can be inspected with pstats or snakeviz)
+    :Param trace_memory: bool, trace the memory allocations with tracemalloc. Tracing slows down every allocation,
+    so the wall and CPU times of a traced run are higher than those of an unprofiled run; every record says whether
+    it was traced ('memory_traced'). Set to False to time the stages without this overhead (peak_memory_bytes is
+    then None)
+    """
+    def __init__(self, subject, profile_directory=None, trace_memory=True):
+        self.subject = subject
+        self.profile_directory = profile_directory
+        self.trace_memory = trace_memory
+        self.records = []
+        self._run_memory_start = 0  # traced memory when run started
+        self._run_peak_memory = 0  # peak memory of the run (relative to its start) before the last reset_peak
+
+    def _update_run_peak(self):
+        """
+        Fold the current tracemalloc peak into the peak of the whole run, before a stage resets it.
+        """
+        if not self.trace_memory:
+            return
+        peak = tracemalloc.get_traced_memory()[1] - self._run_memory_start
+        self._run_peak_memory = max(self._run_peak_memory, peak)
+
+    @contextmanager
+    def stage(self, name, **counts):
+        """
+        Context manager that measures the enclosed stage. Counts (e.g. rows=..., trials=...) can be given
+        up front or updated on the yielded dict from inside the block.
+        The stage is recorded even if it raises.
+        """
+        counts = dict(counts)
+        memory_before = None
+        if self.trace_memory:
+            self._update_run_peak()
+            tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield counts
+        finally:
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            peak_memory = None
+            if self.trace_memory:
+                peak_memory = tracemalloc.get_traced_memory()[1] - memory_before
+                self._update_run_peak()
+            self._record(name, wall, cpu, peak_memory, counts)
+
+    def _record(self, stage, wall, cpu, peak_memory, counts=None):
+        self.records.append(dict({'subject': self.subject, 'stage': stage, 'wall_seconds': wall, 'cpu_seconds': cpu,
+                                  'peak_memory_bytes': peak_memory, 'memory_traced': self.trace_memory},
+                                 **(counts or {})))
+
+    def run(self, function, *args, **kwargs):
+        """
+        Run the processing function of the subject with memory tracing if trace_memory is True (and cProfile if
+        requested), and add a 'total' record for the subject (also if the function raises).
+        The total peak memory is the peak of the whole run, measured from the traced memory at its start.
+        """
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            self._run_memory_start = tracemalloc.get_traced_memory()[0]
+        self._run_peak_memory = 0
+        profile = cProfile.Profile() if self.profile_directory else None
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            if profile:
+                profile.enable()
+            return function(*args, **kwargs)
+        finally:
+            if profile:
+                profile.disable()
+            wall, cpu = time.perf_counter() - wall_start, time.process_time() - cpu_start
+            self._update_run_peak()
+            if started_tracing:
+                tracemalloc.stop()
+            self._record('total', wall, cpu, self._run_peak_memory if self.trace_memory else None)
+            if profile:
+                os.makedirs(self.profile_directory, exist_ok=True)
+                profile.dump_stats(self.profile_directory + os.sep + os.path.splitext(self.subject)[0] + '.prof')
+
+
+@contextmanager
+def no_stage(name, **counts):
+    """
+    Stand-in for SubjectProfiler.stage when profiling is disabled.
+    """
+    yield dict(counts)
+
+
+def write_profile_report(records, path):
+    """
+    This function saves the stage records of all subjects as a JSON (if the path ends with .json) or CSV file.
+    """
+    if path.endswith('.json'):
+        with open(path, 'w') as f:
+            json.dump(records, f, indent=2, default=float)
+    else:
+        pd.DataFrame(records).convert_dtypes().to_csv(path, index=False)  # keep counts as integers
@@ -6,10 +6,18 @@ Batch-process CSVs to add:
   • choice_is_one_more       ((chosen_count - 1) == other_count; NA if practice/no choice)
   • total_one_more_true      (same value in every row; counts True in choice_is_one_more)
 
-Edit DATA_DIR and PRACTICE_TRIALS, then run:  python rank_csv_batch.py
+Run from the command line (defaults come from the CONFIGURATION constants below):
+    python rank_choices.py DATA_DIR --practice-trials 2 --workers 0 --merged all_ranked.csv --skip-up-to-date --seed 1
+Every input gets a <name>_ranked.csv file in the output folder; --merged also writes all of them as one CSV
+with a source_file column. See  python rank_choices.py --help
 Required columns (case-sensitive):  Left_option  Right_option  choice
 """
 
+import argparse
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
 from pathlib import Path
 import pandas as pd
 import numpy as np
@@ -18,16 +26,25 @@ import numpy as np
 DATA_DIR         = Path(r"THE/PATH/TO/YOUR/FOLDER")   # folder with input CSVs
 PRACTICE_TRIALS  = 2                                # skip first N non-blank 'choice' rows
 OUTPUT_SUBDIR    = "ranked"                         # sub-folder for outputs
+RANDOM_SEED      = None                             # int → reproducible tie-break of equal counts
+
+REQUIRED_COLUMNS = ("Left_option", "Right_option", "choice")
 # ---------------------------------------------------------------------------
 
 
-def build_rank_info(df: pd.DataFrame, practice_rows):
+def build_rank_info(df: pd.DataFrame, practice_rows, rng=None):
     """
     Build the popularity ranking *excluding* practice rows and using the union
     of Left_option + Right_option (non-practice only) as the universe of items.
     Every item in that universe appears in the rank string; if never chosen,
     its count is 0.
 
+    Parameters
+    ----------
+    practice_rows : index labels of the practice rows
+    rng           : int seed, numpy Generator or None, for the random tie-break
+                    of items with equal counts (a seed makes the ranking reproducible)
+
     Returns
     -------
     rank_string   : str   e.g. '1: apple (12), 2: grape (0), 3: orange (10)'
@@ -51,14 +68,10 @@ def build_rank_info(df: pd.DataFrame, practice_rows):
         .reindex(universe, fill_value=0)
     )
 
-    # Random tie-break for equal counts
-    counts_df = choice_counts_series.to_frame("count")
-    counts_df["rand"] = np.random.rand(len(counts_df))
-    ranked_items = (
-        counts_df.sort_values(["count", "rand"], ascending=[False, True])
-                 .index
-                 .tolist()
-    )
+    # Random tie-break for equal counts: sort by count (descending), then by a random key
+    rand = np.random.default_rng(rng).random(len(choice_counts_series))
+    order = np.lexsort((rand, -choice_counts_series.to_numpy()))
+    ranked_items = choice_counts_series.index[order].tolist()
 
     # Rank string with counts (zeros included)
     rank_string = ", ".join(
@@ -72,91 +85,178 @@ def build_rank_info(df: pd.DataFrame, practice_rows):
     return rank_string, rank_lookup, choice_counts
 
 
+def file_seed(seed, file_name: str) -> np.random.SeedSequence:
+    """
+    Seed of the tie-break of one input file, spawned from `seed` by the file name (not its position in the folder),
+    so it does not change when other files are added or removed.
+    """
+    digest = hashlib.sha256(file_name.encode("utf-8")).digest()
+    return np.random.SeedSequence(seed, spawn_key=(int.from_bytes(digest[:8], "little"),))
+
+
 def numeric_rank(item, lookup):
     """Return numeric rank; unseen → worst + 1 (safety fallback)."""
     return lookup.get(item, len(lookup) + 1)
 
 
-def process_csv(csv_path: Path, out_dir: Path):
-    df = pd.read_csv(csv_path)
+def _item_counts(items: pd.Series, choice_counts: dict) -> np.ndarray:
+    """Map every item of a column to its chosen count through a categorical lookup; unknown/blank → 0."""
+    codes = pd.Index(list(choice_counts)).get_indexer(items)
+    counts = np.append(np.fromiter(choice_counts.values(), dtype=np.int64, count=len(choice_counts)), 0)
+    return counts[codes]  # code -1 (not in the universe) picks the trailing 0
+
+
+def rank_dataframe(df: pd.DataFrame, practice_trials: int = PRACTICE_TRIALS, rng=None) -> pd.DataFrame:
+    """
+    Add the ranking columns to a data frame with Left_option, Right_option and choice columns.
+    All the columns are computed as array operations over the whole frame.
+
+    Parameters
+    ----------
+    practice_trials : number of leading non-blank 'choice' rows treated as practice
+    rng             : int seed, numpy Generator or None, for the tie-break in build_rank_info
+
+    Returns
+    -------
+    The data frame with choice_rank_string, choice_is_higher_ranked, choice_is_one_more
+    (nullable boolean columns, NA for practice rows and blank choices) and total_one_more_true.
+    """
+    choice = df["choice"]
+    has_choice = (choice.notna() & (choice != "")).to_numpy()
 
     # Identify practice rows (first N non-blank 'choice' rows)
-    nb_idx = df.index[df["choice"].notna() & (df["choice"] != "")]
-    practice_rows = nb_idx[:PRACTICE_TRIALS] if PRACTICE_TRIALS else []
+    practice = np.zeros(len(df), dtype=bool)
+    if practice_trials:
+        practice[np.flatnonzero(has_choice)[:practice_trials]] = True
+    practice_rows = df.index[practice]
 
     # Build ranking info (practice excluded; universe from Left/Right)
-    rank_string, rank_lookup, choice_counts = build_rank_info(df, practice_rows)
+    rank_string, rank_lookup, choice_counts = build_rank_info(df, practice_rows, rng)
     df["choice_rank_string"] = rank_string  # identical in every row
 
+    left, right = df["Left_option"], df["Right_option"]
+    left_count = _item_counts(left, choice_counts)
+    right_count = _item_counts(right, choice_counts)
+    chosen_count = _item_counts(choice, choice_counts)
+    is_left = (choice == left).to_numpy()
+    is_right = (choice == right).to_numpy()
+    not_applicable = practice | ~has_choice
+
     # ------------------------------------------------ choice_is_higher_ranked (counts-based; False on ties)
-    def higher_ranked(row):
-        """
-        True if chosen item has strictly higher count than the other option.
-        False if counts tie or chosen item is lower.
-        NA for practice rows or blank choice.
-        """
-        if row.name in practice_rows:
-            return pd.NA
-        ch = row["choice"]
-        if pd.isna(ch) or ch == "":
-            return pd.NA
+    # True if chosen item has strictly higher count than the other option, False if counts tie or it is lower
+    higher = np.where(left_count > right_count, is_left, is_right) & (left_count != right_count)
+    df["choice_is_higher_ranked"] = pd.array(higher, dtype="boolean")
+    df.loc[not_applicable, "choice_is_higher_ranked"] = pd.NA
 
-        l_item = row["Left_option"]
-        r_item = row["Right_option"]
+    # ------------------------------------------------ choice_is_one_more ((chosen_count - 1) == other_count)
+    # the other option is Right if the choice is Left, Left if it is Right; a choice that matches neither is False
+    other_count = np.where(is_left, right_count, left_count)
+    one_more = ((chosen_count - 1) == other_count) & (is_left | is_right)
+    df["choice_is_one_more"] = pd.array(one_more, dtype="boolean")
+    df.loc[not_applicable, "choice_is_one_more"] = pd.NA
 
-        l_cnt = choice_counts.get(l_item, 0)
-        r_cnt = choice_counts.get(r_item, 0)
+    # ------------------------------------------------ total_one_more_true (constant)
+    total_true = int(df["choice_is_one_more"].sum(skipna=True))
+    df["total_one_more_true"] = total_true
+    return df
 
-        if l_cnt == r_cnt:
-            return False
 
-        higher_item = l_item if l_cnt > r_cnt else r_item
-        return higher_item == ch
+def ranked_path(csv_path: Path, out_dir: Path) -> Path:
+    """Output path of the ranked version of an input CSV."""
+    return out_dir / f"{csv_path.stem}_ranked.csv"
 
-    df["choice_is_higher_ranked"] = df.apply(higher_ranked, axis=1)
 
-    # ------------------------------------------------ choice_is_one_more ((chosen_count - 1) == other_count)
-    def one_more(row):
-        if row.name in practice_rows:
-            return pd.NA
-        ch = row["choice"]
-        if pd.isna(ch) or ch == "":
-            return pd.NA
+def is_up_to_date(csv_path: Path, out_dir: Path) -> bool:
+    """True if the ranked output exists and is newer than its input."""
+    out_path = ranked_path(csv_path, out_dir)
+    return out_path.exists() and out_path.stat().st_mtime >= csv_path.stat().st_mtime
 
-        if ch == row["Left_option"]:
-            other = row["Right_option"]
-        elif ch == row["Right_option"]:
-            other = row["Left_option"]
-        else:
-            return False  # data mismatch
 
-        chosen_total = choice_counts.get(ch, 0)
-        other_total  = choice_counts.get(other, 0)
+def process_csv(csv_path: Path, out_dir: Path, practice_trials: int = PRACTICE_TRIALS, rng=None):
+    df = rank_dataframe(pd.read_csv(csv_path), practice_trials, rng)
 
-        return (chosen_total - 1) == other_total
+    # ------------------------------------------------ save
+    out_path = ranked_path(csv_path, out_dir)
+    df.to_csv(out_path, index=False)
+    print(f"✔ {csv_path.name} → {os.path.relpath(out_path, csv_path.parent)}")
+    return out_path
 
-    df["choice_is_one_more"] = df.apply(one_more, axis=1)
 
-    # ------------------------------------------------ total_one_more_true (constant)
-    total_true = int(df["choice_is_one_more"].sum(skipna=True))
-    df["total_one_more_true"] = total_true
+def list_input_files(data_dir: Path, exclude=()) -> list:
+    """Input CSVs of the data folder, sorted by name (ranked outputs and excluded paths are skipped)."""
+    exclude = {Path(path).resolve() for path in exclude}
+    return [path for path in sorted(data_dir.glob("*.csv"))
+            if not path.stem.endswith("_ranked") and path.resolve() not in exclude]
 
-    # ------------------------------------------------ save
-    out_path = out_dir / f"{csv_path.stem}_ranked.csv"
-    df.to_csv(out_path, index=False)
-    print(f"✔ {csv_path.name} → {out_path.relative_to(DATA_DIR)}")
 
+def process_folder(data_dir: Path, out_dir: Path, practice_trials: int = PRACTICE_TRIALS, num_workers: int = 1,
+                   merged_path: Path = None, skip_up_to_date: bool = False, seed=None) -> list:
+    """
+    Rank every CSV of a folder, over a process pool.
 
-if __name__ == "__main__":
-    if not DATA_DIR.is_dir():
-        raise SystemExit(f"[!] DATA_DIR not found: {DATA_DIR}")
+    Parameters
+    ----------
+    num_workers     : number of processes (1 → current process, 0 → all cores)
+    merged_path     : if given, also write all the ranked outputs to this single CSV (with a source_file column)
+    skip_up_to_date : do not rank again inputs whose ranked output is newer than the input
+    seed            : int or None; every file gets its own random stream for the tie-break, derived from the seed
+                      and its file name (see file_seed), so results do not depend on the number of workers or on
+                      the other files of the folder
 
-    csv_files = sorted(DATA_DIR.glob("*.csv"))
+    Returns
+    -------
+    list of the ranked output paths, in input order
+    """
+    csv_files = list_input_files(data_dir, exclude=[merged_path] if merged_path else [])
     if not csv_files:
-        raise SystemExit(f"[!] No CSV files in {DATA_DIR}")
+        raise SystemExit(f"[!] No CSV files in {data_dir}")
+    out_dir.mkdir(parents=True, exist_ok=True)
+
+    jobs = [(csv_path, file_seed(seed, csv_path.name)) for csv_path in csv_files
+            if not (skip_up_to_date and is_up_to_date(csv_path, out_dir))]
+    print(f"ranking {len(jobs)} of {len(csv_files)} files")
+    rank_file = partial(_rank_job, out_dir=out_dir, practice_trials=practice_trials)
+    if num_workers == 1 or len(jobs) <= 1:
+        list(map(rank_file, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=num_workers or None) as executor:
+            list(executor.map(rank_file, jobs))
+
+    out_paths = [ranked_path(csv_path, out_dir) for csv_path in csv_files]
+    if merged_path:
+        merged = pd.concat([pd.read_csv(out_path).assign(source_file=csv_path.name)
+                            for csv_path, out_path in zip(csv_files, out_paths)], ignore_index=True)
+        merged.to_csv(merged_path, index=False)
+        print(f"✔ merged {len(out_paths)} files → {merged_path}")
+    return out_paths
+
+
+def _rank_job(job, out_dir, practice_trials):
+    csv_path, seed = job
+    return process_csv(csv_path, out_dir, practice_trials, np.random.default_rng(seed))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("data_dir", nargs="?", type=Path, default=DATA_DIR, help="folder with the input CSVs")
+    parser.add_argument("--output-dir", type=Path, default=None,
+                        help=f"folder of the ranked outputs (default: DATA_DIR/{OUTPUT_SUBDIR})")
+    parser.add_argument("--practice-trials", type=int, default=PRACTICE_TRIALS,
+                        help="skip the first N non-blank 'choice' rows of every file")
+    parser.add_argument("--workers", type=int, default=1, help="number of processes, 0 = all cores")
+    parser.add_argument("--merged", type=Path, default=None,
+                        help="also write all the ranked files to this single CSV")
+    parser.add_argument("--skip-up-to-date", action="store_true",
+                        help="skip inputs whose ranked output is newer than the input")
+    parser.add_argument("--seed", type=int, default=RANDOM_SEED, help="seed of the tie-break of equal counts")
+    args = parser.parse_args(argv)
+
+    if not args.data_dir.is_dir():
+        raise SystemExit(f"[!] DATA_DIR not found: {args.data_dir}")
+    out_dir = args.output_dir or args.data_dir / OUTPUT_SUBDIR
+    return process_folder(args.data_dir, out_dir, args.practice_trials, args.workers, args.merged,
+                          args.skip_up_to_date, args.seed)
 
-    out_dir = DATA_DIR / OUTPUT_SUBDIR
-    out_dir.mkdir(exist_ok=True)
 
-    for csv in csv_files:
-        process_csv(csv, out_dir)
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+import pandas as pd
+
+# Increase when a change in the preprocessing code changes the results, to invalidate older cache entries
+CACHE_VERSION = 1
+
+
+def file_hash(path, block_size=1 << 20):
+    """
+    Returns the sha256 hex digest of the content of a file.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_key(path, parameters):
+    """
+    Returns the cache key of a subject file: a hash of the file content together with
+    the processing parameters (column names, practice mode, trial counts, NUM_TIMEPOINTS...).
+    :Param parameters: dict of the parameters that affect the processing result
+    """
+    description = json.dumps({'version': CACHE_VERSION, 'file': file_hash(path), 'parameters': parameters},
+                             sort_keys=True, default=str)
+    return hashlib.sha256(description.encode('utf-8')).hexdigest()
+
+
+def _entry_path(cache_directory, key):
+    return cache_directory + os.sep + key + '.pkl'
+
+
+def is_cached(cache_directory, key):
+    """
+    Returns True if there is a cache entry for the key.
+    """
+    return os.path.exists(_entry_path(cache_directory, key))
+
+
+def load_cached_result(cache_directory, key):
+    """
+    Returns the cached processing result of a subject, or None if there is no cache entry for the key.
+    """
+    path = _entry_path(cache_directory, key)
+    if not os.path.exists(path):
+        return None
+    return pd.read_pickle(path)
+
+
+def save_cached_result(cache_directory, key, result):
+    """
+    Stores the processing result of a subject. The entry is written to a temporary file first,
+    so an interrupted run never leaves a partial entry behind.
+    """
+    os.makedirs(cache_directory, exist_ok=True)
+    path = _entry_path(cache_directory, key)
+    pd.to_pickle(result, path + '.tmp')
+    os.replace(path + '.tmp', path)
+
+
+def prune_cache(cache_directory, keys):
+    """
+    Removes the cache entries whose key is not in `keys`, and the temporary files left by interrupted runs,
+    so that entries of changed files or parameters do not accumulate.
+    :Return: number of removed entries
+    """
+    if not os.path.isdir(cache_directory):
+        return 0
+    used = {os.path.basename(_entry_path(cache_directory, key)) for key in keys}
+    num_removed = 0
+    for name in os.listdir(cache_directory):
+        if (name.endswith('.pkl') and name not in used) or name.endswith('.pkl.tmp'):
+            os.remove(cache_directory + os.sep + name)
+            num_removed += name.endswith('.pkl')
+    return num_removed
@@ -0,0 +1,217 @@
+import numpy as np
+
+
+def valid_lengths(matrix):
+    """
+    Return the number of non-NaN samples in every column of a (samples x trials) matrix.
+    """
+    return (~np.isnan(matrix)).sum(axis=0)
+
+
+def sample_extents(matrix):
+    """
+    Return the number of samples of every column of a (samples x trials) matrix up to its last non-NaN sample,
+    i.e. the recorded length of every trial including the missing samples in its middle.
+    """
+    valid = ~np.isnan(matrix)
+    if matrix.shape[0] == 0:
+        return np.zeros(matrix.shape[1], dtype=np.intp)
+    last = matrix.shape[0] - np.argmax(valid[::-1, :], axis=0)
+    return np.where(valid.any(axis=0), last, 0)
+
+
+def compact_columns(matrix):
+    """
+    Move the non-NaN samples of every column to the top of the column (keeping their order),
+    so that each trajectory is stored as a contiguous block followed by NaN padding.
+    Columns that are already NaN-padded only at the end are returned unchanged.
+    """
+    missing = np.isnan(matrix)
+    if not np.any(missing[:-1] & ~missing[1:]):  # no NaN is followed by a valid sample
+        return matrix
+    order = np.argsort(missing, axis=0, kind='stable')
+    return np.take_along_axis(matrix, order, axis=0)
+
+
+def drop_unpaired_samples(x, y, t=None):
+    """
+    Drop from the x, y (and t) matrices every sample that is missing (NaN) in any of them, and compact the
+    columns, so that the remaining samples of a trial stay paired after a malformed token in a single axis.
+    The matrices are NaN-padded to the same number of samples. Columns of t without any valid sample
+    (trials without usable timestamps) are ignored when building the mask.
+    :Param x, y: numpy arrays of shape (samples, num_trials), NaN-padded
+    :Param t: numpy array of shape (samples, num_trials) or None
+    :Return: (x, y, t), with t None if it was not given
+    """
+    matrices = [x, y] if t is None else [x, y, t]
+    num_samples = max(matrix.shape[0] for matrix in matrices)
+    matrices = [np.pad(matrix, ((0, num_samples - matrix.shape[0]), (0, 0)), constant_values=np.nan)
+                for matrix in matrices]
+    missing = np.isnan(matrices[0]) | np.isnan(matrices[1])
+    if t is not None:
+        missing |= np.isnan(matrices[2]) & (valid_lengths(matrices[2]) > 0)
+    for matrix in matrices:
+        matrix[missing] = np.nan
+    matrices = [compact_columns(matrix) for matrix in matrices]
+    return matrices[0], matrices[1], matrices[2] if t is not None else None
+
+
+def resample_trajectories(matrix, num_timepoints):
+    """
+    Linearly resample all the variable-length trajectories of a (samples x trials) matrix to
+    `num_timepoints` equally spaced points in a single array pass.
+    Every column is resampled over its own valid (non-NaN) length, so NaN-padded columns of
+    different lengths are handled together. The result is identical to applying
+    scipy.interpolate.interp1d to each column separately.
+    Columns with a single valid sample are repeated, columns without valid samples become NaN.
+    :Param matrix: numpy array of shape (max_samples, num_trials), NaN-padded
+    :Param num_timepoints: int, number of time points in the normalized trajectories
+    :Return: numpy array of shape (num_timepoints, num_trials), of the float dtype of matrix (float32 or float64)
+    """
+    matrix = np.asarray(matrix)
+    if matrix.dtype not in (np.float32, np.float64):
+        matrix = matrix.astype(np.float64)
+    matrix = compact_columns(matrix)
+    num_samples, num_trials = matrix.shape
+    lengths = valid_lengths(matrix)
+    if num_trials == 0 or num_samples == 0:
+        return np.full([num_timepoints, num_trials], np.nan, dtype=matrix.dtype)
+
+    # same sample positions np.linspace(0, length-1, num_timepoints) gives for every column
+    last = (lengths - 1).astype(np.float64)
+    step = last / max(num_timepoints - 1, 1)
+    positions = np.arange(num_timepoints, dtype=np.float64)[:, np.newaxis] * step
+    positions[-1, :] = last
+
+    # interval lookup as in interp1d (searchsorted 'left', clipped to the valid range)
+    hi = np.clip(np.ceil(positions).astype(np.intp), 1, np.maximum(lengths - 1, 1))
+    lo = hi - 1
+    hi = np.minimum(hi, num_samples - 1)
+    y_lo = np.take_along_axis(matrix, lo, axis=0)
+    y_hi = np.take_along_axis(matrix, hi, axis=0)
+    resampled = (y_hi - y_lo) * (positions - lo).astype(matrix.dtype) + y_lo  # x_hi - x_lo == 1
+
+    resampled[:, lengths == 1] = matrix[0, lengths == 1]
+    resampled[:, lengths == 0] = np.nan
+    return resampled
+
+
+def _trapezoid(values, dx):
+    """
+    Trapezoidal integration along the first axis (np.trapz was renamed np.trapezoid in numpy 2).
+    """
+    trapezoid = getattr(np, 'trapezoid', None) or np.trapz
+    return trapezoid(values, dx=dx, axis=0)
+
+
+def x_flips(x):
+    """
+    Count the x flips (changes of direction along the x-axis) of every trial.
+    The comparison point only advances when the x coordinate changes, exactly like the original
+    trial-by-trial implementation, so the loop runs over time points while all the trials are updated together.
+    :Param x: numpy array of shape (num_timepoints, num_trials)
+    :Return: numpy array of shape (num_trials,) with the number of flips of each trial
+    """
+    num_timepoints, num_trials = x.shape
+    trials = np.arange(num_trials)
+    last = np.zeros(num_trials, dtype=np.intp)
+    bigger = np.zeros(num_trials, dtype=bool)
+    smaller = np.zeros(num_trials, dtype=bool)
+    flips = np.zeros(num_trials, dtype=np.int64)
+    for i in range(1, num_timepoints):
+        current = x[i, :]
+        decreasing = x[last, trials] > current
+        repeated = decreasing & bigger  # direction did not change, skip the second comparison
+        new_direction = decreasing & ~bigger
+        last += decreasing
+        bigger |= decreasing
+        smaller &= ~decreasing
+        if i != 1:
+            flips += new_direction
+
+        increasing = (x[last, trials] < current) & ~repeated
+        new_direction = increasing & ~smaller
+        last += increasing
+        smaller |= increasing
+        bigger &= ~increasing
+        if i != 1:
+            flips += new_direction
+    return flips
+
+
+def returns_to_point_of_balance(x):
+    """
+    Count the number of times every trajectory crosses the middle of the x-axis (x == 0).
+    :Param x: numpy array of shape (num_timepoints, num_trials), after rescaling
+    """
+    before, after = x[:-1, :], x[1:, :]
+    crosses = ((before > 0) & (after < 0)) | ((before < 0) & (after > 0))
+    return crosses.sum(axis=0)
+
+
+def area_under_curve(x, y, normalized_y):
+    """
+    Integrate the distance between every trajectory and the straight line from (0,0) to the chosen target.
+    :Param x, y: numpy arrays of shape (num_timepoints, num_trials), after rescaling and remapping
+    :Param normalized_y: the y coordinate of the targets after rescaling
+    """
+    num_timepoints = x.shape[0]
+    return _trapezoid(y - normalized_y * x, dx=1 / num_timepoints)
+
+
+def initiation_angle(x, y, point_of_angle):
+    """
+    Calculate the absolute angle (in degrees) between the x-axis and the movement from the first
+    time point to `point_of_angle`, for every trial.
+    """
+    angle = np.arctan2(y[0, :] - y[point_of_angle, :], x[point_of_angle, :] - x[0, :])
+    return np.abs(np.degrees(angle))
+
+
+def trajectory_length(x, y):
+    """
+    Sum the euclidean distances between consecutive time points of every trajectory.
+    """
+    steps = np.sqrt(np.diff(x, axis=0) ** 2 + np.diff(y, axis=0) ** 2)
+    return steps.sum(axis=0)
+
+
+def straight_line_length(x, y):
+    """
+    Calculate the euclidean distance between the first and the last time point of every trajectory.
+    """
+    return np.sqrt((x[-1, :] - x[0, :]) ** 2 + (y[-1, :] - y[0, :]) ** 2)
+
+
+def max_deviation(x, y):
+    """
+    Calculate, for every trial, the maximal distance between the trajectory and the straight line segment
+    connecting its first and last points. The distance of each point is computed in closed form by
+    projecting it on the segment, so the cost is linear in the number of time points.
+    :Param x, y: numpy arrays of shape (num_timepoints, num_trials)
+    """
+    start_x, start_y = x[0, :], y[0, :]
+    line_x, line_y = x[-1, :] - start_x, y[-1, :] - start_y
+    squared_length = line_x ** 2 + line_y ** 2
+    rel_x, rel_y = x - start_x, y - start_y
+    with np.errstate(invalid='ignore', divide='ignore'):
+        projection = (rel_x * line_x + rel_y * line_y) / squared_length
+    # trials that start and end at the same point are measured from that point
+    projection = np.where(squared_length > 0, np.clip(projection, 0, 1), 0)
+    distances = np.sqrt((rel_x - projection * line_x) ** 2 + (rel_y - projection * line_y) ** 2)
+    return distances.max(axis=0)
+
+
+def max_deviation_sampled(x, y):
+    """
+    The original max deviation approximation: the straight line is sampled at num_timepoints points and
+    each trajectory point is measured against its nearest line sample. Kept to reproduce published results.
+    """
+    num_timepoints = x.shape[0]
+    line_x = np.linspace(x[0, :], x[-1, :], num_timepoints)
+    line_y = np.linspace(y[0, :], y[-1, :], num_timepoints)
+    deviation = np.zeros(x.shape[1], dtype=x.dtype)
+    for j in range(num_timepoints):
+        nearest = np.sqrt((line_x - x[j, :]) ** 2 + (line_y - y[j, :]) ** 2).min(axis=0)
+        deviation = np.maximum(deviation, nearest)
+    return deviation
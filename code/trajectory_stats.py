@@ -0,0 +1,204 @@
+"""
+Bootstrap and permutation statistics over normalized trajectories.
+
+The analyses work on subject means: arrays of shape (NUM_TIMEPOINTS, num_subjects) with the mean trajectory
+(or any per-time-point measure) of every subject in a condition (see subject_means), so that the subjects,
+and not the trials, are the resampled units.
+Resamples are drawn in batches as matrix products, and the batches can be spread over a process pool.
+Every batch has its own random stream derived from the seed, so for a given seed and batch size the results do not
+depend on the number of workers.
+"""
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from scipy import stats
+
+
+def subject_means(coordinates, subjects):
+    """
+    This function averages the trials of every subject in a single grouped reduction.
+    :Param coordinates: numpy array of shape (NUM_TIMEPOINTS, num_trials), e.g. the x coordinates of the trials
+    of one condition
+    :Param subjects: array with the subject id of every trial (num_trials,)
+    :Return: (subject_ids, means) where means has shape (NUM_TIMEPOINTS, num_subjects)
+    """
+    subject_ids, codes = np.unique(np.asarray(subjects), return_inverse=True)
+    order = np.argsort(codes, kind='stable')
+    starts = np.flatnonzero(np.r_[True, np.diff(codes[order]) != 0])
+    sums = np.add.reduceat(np.asarray(coordinates)[:, order], starts, axis=1)
+    return subject_ids, sums / np.bincount(codes)
+
+
+def _seed_sequence(rng):
+    """
+    Returns the root SeedSequence of an analysis from a seed (int or None) or a numpy Generator.
+    """
+    if isinstance(rng, np.random.Generator):
+        return np.random.SeedSequence(int(rng.integers(2 ** 63)))
+    return np.random.SeedSequence(rng)
+
+
+def _run_batches(batch_function, num_resamples, batch_size, rng, num_workers):
+    """
+    Split `num_resamples` into batches, each with its own child seed, and run batch_function(size, seed) on
+    every batch (in parallel if num_workers > 1; 0 or None uses all cores).
+    :Return: list of the batch results, in batch order
+    """
+    sizes = [batch_size] * (num_resamples // batch_size)
+    if num_resamples % batch_size:
+        sizes.append(num_resamples % batch_size)
+    seeds = _seed_sequence(rng).spawn(len(sizes))
+    if num_workers is None or num_workers == 0:
+        num_workers = None  # ProcessPoolExecutor uses all the cores
+    elif num_workers == 1 or len(sizes) == 1:
+        return list(map(batch_function, sizes, seeds))
+    with ProcessPoolExecutor(max_workers=num_workers) as executor:
+        return list(executor.map(batch_function, sizes, seeds))
+
+
+def _bootstrap_batch(means, size, seed):
+    num_subjects = means.shape[1]
+    counts = np.random.default_rng(seed).multinomial(num_subjects, np.full(num_subjects, 1 / num_subjects), size)
+    return means @ counts.T / num_subjects
+
+
+def bootstrap_ci(means, num_resamples=10000, confidence=0.95, rng=None, num_workers=1, batch_size=1000):
+    """
+    This function calculates pointwise bootstrap confidence intervals of the mean over subjects.
+    For the difference between two conditions of the same subjects, pass the difference of their subject means.
+    :Param means: numpy array of shape (NUM_TIMEPOINTS, num_subjects), subjects with missing values should be removed
+    :Param num_resamples: int, number of bootstrap resamples of the subjects
+    :Param confidence: float, confidence level of the percentile intervals
+    :Param rng: int seed, numpy Generator or None, for reproducible resamples
+    :Param num_workers: int, number of processes (1 runs in the current process, 0 or None uses all cores)
+    :Param batch_size: int, number of resamples drawn together (memory is NUM_TIMEPOINTS * batch_size values)
+    :Return: dict with 'mean', 'lower', 'upper' and 'standard_error' (bootstrap SE), arrays of (NUM_TIMEPOINTS,)
+    """
+    means = np.asarray(means, dtype=np.float64)
+    batches = _run_batches(partial(_bootstrap_batch, means), num_resamples, batch_size, rng, num_workers)
+    resampled = np.concatenate(batches, axis=1)
+    alpha = (1 - confidence) / 2
+    lower, upper = np.quantile(resampled, [alpha, 1 - alpha], axis=1)
+    return {'mean': means.mean(axis=1), 'lower': lower, 'upper': upper,
+            'standard_error': resampled.std(axis=1, ddof=1)}
+
+
+def _paired_t(differences, signs):
+    """
+    t statistics of the mean of the subject differences (NUM_TIMEPOINTS, num_subjects) under every row of
+    sign flips (num_permutations, num_subjects). The sum of squares does not change when signs are flipped.
+    """
+    num_subjects = differences.shape[1]
+    mean = differences @ signs.T / num_subjects
+    sum_of_squares = (differences ** 2).sum(axis=1)[:, np.newaxis]
+    variance = (sum_of_squares - num_subjects * mean ** 2) / (num_subjects - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return mean / np.sqrt(variance / num_subjects)
+
+
+def _welch_t(pooled, membership):
+    """
+    Welch t statistics of group A minus group B for every row of the membership matrix
+    (num_permutations, num_subjects), where 1 marks the subjects of group A.
+    """
+    size_a = membership.sum(axis=1)
+    size_b = pooled.shape[1] - size_a
+    sum_a, squares_a = pooled @ membership.T, (pooled ** 2) @ membership.T
+    sum_b = pooled.sum(axis=1)[:, np.newaxis] - sum_a
+    squares_b = (pooled ** 2).sum(axis=1)[:, np.newaxis] - squares_a
+    mean_a, mean_b = sum_a / size_a, sum_b / size_b
+    variance_a = (squares_a - size_a * mean_a ** 2) / (size_a - 1)
+    variance_b = (squares_b - size_b * mean_b ** 2) / (size_b - 1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (mean_a - mean_b) / np.sqrt(variance_a / size_a + variance_b / size_b)
+
+
+def _max_cluster_mass(t, threshold):
+    """
+    The largest cluster mass (sum of |t| over consecutive time points beyond the threshold, positive and negative
+    clusters separately) of every column of t (NUM_TIMEPOINTS, num_permutations).
+    """
+    largest = np.zeros(t.shape[1])
+    for signed in (t, -t):
+        above = np.nan_to_num(signed) > threshold
+        cumulative = np.cumsum(np.where(above, signed, 0), axis=0)
+        # subtract the cumulative sum at the last time point before the current cluster
+        cluster_mass = cumulative - np.maximum.accumulate(np.where(above, 0, cumulative), axis=0)
+        largest = np.maximum(largest, cluster_mass.max(axis=0))
+    return largest
+
+
+def _clusters(t, threshold):
+    """
+    Returns the clusters of the observed t statistics (NUM_TIMEPOINTS,) as a list of (start, end, mass),
+    where end is the last time point of the cluster.
+    """
+    clusters = []
+    for sign in (1, -1):
+        above = np.r_[False, np.nan_to_num(sign * t) > threshold, False]
+        edges = np.flatnonzero(np.diff(above.astype(np.int8)))
+        for start, stop in zip(edges[::2], edges[1::2]):
+            clusters.append((int(start), int(stop - 1), float(np.abs(t[start:stop]).sum())))
+    return sorted(clusters)
+
+
+def _permutation_batch(data, paired, num_a, observed_t, threshold, size, seed):
+    rng = np.random.default_rng(seed)
+    num_subjects = data.shape[1]
+    if paired:
+        t = _paired_t(data, rng.choice([-1.0, 1.0], size=(size, num_subjects)))
+    else:
+        membership = (rng.random((size, num_subjects)).argsort(axis=1) < num_a).astype(np.float64)
+        t = _welch_t(data, membership)
+    exceed = (np.abs(np.nan_to_num(t)) >= np.abs(observed_t)[:, np.newaxis]).sum(axis=1)
+    return exceed, _max_cluster_mass(t, threshold)
+
+
+def permutation_test(means_a, means_b, paired=True, num_permutations=10000, threshold=None, rng=None,
+                     num_workers=1, batch_size=1000):
+    """
+    This function tests the difference between two conditions at every time point, with cluster-based correction
+    for the multiple time points.
+    Paired designs (the same subjects in both conditions, in the same order) flip the sign of the subject
+    differences, independent designs shuffle the subjects between the groups. Clusters are runs of consecutive time
+    points where |t| exceeds the threshold, and their mass (sum of |t|) is compared with the null distribution of
+    the largest cluster mass.
+    :Param means_a, means_b: numpy arrays of shape (NUM_TIMEPOINTS, num_subjects) of the two conditions
+    :Param paired: bool, whether the conditions are within subjects
+    :Param num_permutations: int, number of permutations
+    :Param threshold: float | None, cluster-forming |t| threshold, by default the two-sided 0.05 critical t value
+    :Param rng: int seed, numpy Generator or None, for reproducible permutations
+    :Param num_workers: int, number of processes (1 runs in the current process, 0 or None uses all cores)
+    :Param batch_size: int, number of permutations computed together
+    :Return: dict with 'difference' (mean A - B), 't', 'p_values' (uncorrected pointwise permutation p values),
+    'threshold' and 'clusters', a list of dicts with 'start', 'end' (time points), 'mass' and 'p_value'
+    """
+    means_a = np.asarray(means_a, dtype=np.float64)
+    means_b = np.asarray(means_b, dtype=np.float64)
+    if paired:
+        if means_a.shape != means_b.shape:
+            raise ValueError("Paired conditions need the same subjects, got shapes " +
+                             str(means_a.shape) + " and " + str(means_b.shape))
+        data = means_a - means_b
+        observed_t = _paired_t(data, np.ones((1, data.shape[1])))[:, 0]
+        degrees_of_freedom = data.shape[1] - 1
+    else:
+        data = np.concatenate([means_a, means_b], axis=1)
+        membership = (np.arange(data.shape[1]) < means_a.shape[1]).astype(np.float64)[np.newaxis, :]
+        observed_t = _welch_t(data, membership)[:, 0]
+        degrees_of_freedom = data.shape[1] - 2
+    if threshold is None:
+        threshold = stats.t.ppf(0.975, degrees_of_freedom)
+
+    batch_function = partial(_permutation_batch, data, paired, means_a.shape[1], observed_t, threshold)
+    batches = _run_batches(batch_function, num_permutations, batch_size, rng, num_workers)
+    exceed = sum(batch[0] for batch in batches)
+    null_masses = np.concatenate([batch[1] for batch in batches])
+
+    clusters = [{'start': start, 'end': end, 'mass': mass,
+                 'p_value': (1 + np.sum(null_masses >= mass)) / (1 + num_permutations)}
+                for start, end, mass in _clusters(observed_t, threshold)]
+    p_values = (1 + exceed) / (1 + num_permutations)
+    p_values[np.isnan(observed_t)] = np.nan  # no variance at this time point
+    return {'difference': means_a.mean(axis=1) - means_b.mean(axis=1), 't': observed_t,
+            'p_values': p_values, 'threshold': threshold, 'clusters': clusters}
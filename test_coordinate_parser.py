@@ -0,0 +1,20 @@
+import sys
+sys.path.append('code')
+import numpy as np
+import pandas as pd
+from coordinate_parser import parse_coordinate_column
+
+
+def test_ragged_rows_are_nan_padded():
+    matrix, bad_rows = parse_coordinate_column(pd.Series(["652,660,684.5", "1,2"], index=[7, 9]))
+    expected = np.array([[652, 1], [660, 2], [684.5, np.nan]])
+    np.testing.assert_array_equal(matrix, expected)
+    assert len(bad_rows) == 0
+
+
+def test_malformed_rows_are_reported():
+    matrix, bad_rows = parse_coordinate_column(pd.Series(["1,2,3", "4,,6", "7,abc", np.nan, " 8 , 9"]))
+    np.testing.assert_array_equal(bad_rows, [1, 2, 3])
+    np.testing.assert_array_equal(matrix[:, 1], [4, np.nan, 6])
+    np.testing.assert_array_equal(matrix[:, 2], [7, np.nan, np.nan])
+    np.testing.assert_array_equal(matrix[:2, 4], [8, 9])
@@ -0,0 +1,25 @@
+import sys
+sys.path.append('code')
+import pandas as pd
+from export_reader import split_export, participant_file_name
+
+
+def test_split_export_keeps_rows_and_text(tmp_path):
+    export = tmp_path / 'export.csv'
+    export.write_text('participant,trial,x_cord\n'
+                      'a,1,"1,2,3"\n'
+                      'b,1,\n'
+                      'a,2,"4,5"\n'
+                      ',3,"6"\n'
+                      'b,2,"7,8"\n'
+                      'a,3,NA\n')
+    paths = split_export(str(export), 'participant', str(tmp_path / 'split'), chunk_size=2)
+    assert list(paths) == ['a', 'b']
+    assert open(paths['a']).read() == 'participant,trial,x_cord\na,1,"1,2,3"\na,2,"4,5"\na,3,NA\n'
+    assert pd.read_csv(paths['b'])['trial'].tolist() == [1, 2]
+
+
+def test_participant_file_names_are_safe_and_unique():
+    used_names = {'participant_a_b.csv'}
+    assert participant_file_name('x y', set()) == 'participant_x_y.csv'
+    assert participant_file_name('a/b', used_names) == 'participant_a_b_2.csv'
@@ -0,0 +1,29 @@
+import sys
+sys.path.append('code')
+import numpy as np
+from kinematics import derivative, kinematic_profiles, movement_initiation_index
+
+
+def test_derivative_uses_the_time_axis_of_every_trial():
+    rng = np.random.default_rng(0)
+    steps = rng.uniform(10, 20, size=5)  # a different (uniform) sampling interval for every trial
+    times = np.arange(101)[:, np.newaxis] * steps
+    values = rng.normal(size=(101, 5))
+    result = derivative(values, times)
+    for trial in range(5):
+        np.testing.assert_allclose(result[:, trial], np.gradient(values[:, trial], steps[trial]))
+    np.testing.assert_allclose(derivative(2 * times, times), 2)
+
+
+def test_kinematic_profiles_of_a_constant_speed_trajectory():
+    times = np.tile(np.arange(101, dtype=float)[:, np.newaxis] * 10, (1, 2))  # 10 ms steps
+    x = np.tile(np.linspace(0, 1, 101)[:, np.newaxis], (1, 2))
+    profiles = kinematic_profiles(x, np.zeros_like(x), times)
+    np.testing.assert_allclose(profiles['speed'], 1)  # 1 unit in 1 second
+    np.testing.assert_allclose(profiles['speed_normalized'], 1)
+    np.testing.assert_allclose(profiles['acceleration'], 0, atol=1e-9)
+
+
+def test_movement_initiation_index():
+    x = np.array([[0, 0, 0], [0, 1, 0], [2, 2, 0]], dtype=float)
+    np.testing.assert_array_equal(movement_initiation_index(x, np.zeros_like(x)), [1, 0, -1])
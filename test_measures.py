@@ -0,0 +1,97 @@
+import sys
+sys.path.append('code')
+sys.path.append('benchmarks')
+import os
+import numpy as np
+import pandas as pd
+import pytest
+import measures
+from measures import MEASURES, register_measure, load_measure_plugins
+from Preprocessing import Preprocessing
+from process_across_subjects import process_across_subjects
+from synthetic_data import generate_study
+
+PLUGIN = '''
+import numpy as np
+from measures import register_measure
+
+
+@register_measure('end_height', requires=('remap',))
+def end_height(x, y, context):
+    return y[-1, :] * {scale}
+'''
+
+
+@pytest.fixture(autouse=True)
+def registry():
+    """
+    Restore the measure registry after every test.
+    """
+    registered = MEASURES.copy()
+    yield
+    MEASURES.clear()
+    MEASURES.update(registered)
+
+
+def write_plugin(directory, module_name, scale=1):
+    path = str(directory / (module_name + '.py'))
+    with open(path, 'w') as f:
+        f.write(PLUGIN.format(scale=scale))
+    return path
+
+
+def write_subject(path):
+    pd.DataFrame({'x_cord': ["640,540,440", "640,740,840"], 'y_cord': ["560,460,360"] * 2}).to_csv(path, index=False)
+    return str(path)
+
+
+def test_plugin_measures_are_extra_columns(tmp_path):
+    module, = load_measure_plugins([write_plugin(tmp_path, 'plugin_columns')])
+    assert load_measure_plugins(['plugin_columns']) == [module]  # by module name, without importing it again
+    subject = Preprocessing(write_subject(tmp_path / 'subject.csv'), 'x_cord', 'y_cord')
+    subject.calculate_all_measures()
+    assert list(subject.df.columns)[-1] == 'end_height'
+    np.testing.assert_allclose(subject.df['end_height'], [1.5, 1.5])
+
+
+def test_example_plugin_loads():
+    load_measure_plugins(['custom_measures_example'])
+    assert all(MEASURES[name].requires == ('remap',)
+               for name in ['peak_speed', 'peak_speed_timepoint', 'peak_deviation_timepoint'])
+
+
+def test_duplicate_measure_names_are_rejected():
+    with pytest.raises(ValueError, match='already registered'):
+        @register_measure('AUC')
+        def other_AUC(x, y, context):
+            return x[0, :]
+    assert MEASURES['AUC'].function is measures.AUC
+
+
+def test_measures_with_the_wrong_shape_are_rejected(tmp_path):
+    @register_measure('total_height')
+    def total_height(x, y, context):
+        return np.array([y.sum()])
+
+    subject = Preprocessing(write_subject(tmp_path / 'subject.csv'), 'x_cord', 'y_cord')
+    with pytest.raises(ValueError, match='total_height'):
+        subject.get_measure('total_height')
+
+
+def test_plugin_file_is_part_of_the_cache_key(tmp_path, capsys):
+    data_directory, output_directory = str(tmp_path / 'data'), str(tmp_path / 'output')
+    os.makedirs(output_directory)
+    generate_study(data_directory, 2, num_trials=4, num_samples=15, num_extra_rows=0)
+    plugin = write_plugin(tmp_path, 'plugin_cache')
+
+    def run():
+        path = process_across_subjects(data_directory, output_directory, 'x_cord', 'y_cord',
+                                       cache_directory=str(tmp_path / 'cache'), measure_plugins=[plugin])
+        return pd.read_csv(path)
+
+    assert 'end_height' in run().columns
+    run()
+    assert "found cached results for 2 of 2" in capsys.readouterr().out
+    write_plugin(tmp_path, 'plugin_cache', scale=2)
+    run()
+    assert "found cached results for 0 of 2" in capsys.readouterr().out
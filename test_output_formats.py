@@ -0,0 +1,51 @@
+import sys
+sys.path.append('code')
+import numpy as np
+import pandas as pd
+import pytest
+from output_formats import check_output_format, write_unified_dataset, read_unified_dataset, read_metadata
+
+
+def make_dataset(dtype):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'subject_id': [1, 1, 2, 2], 'trajectory': ['shown', 'hidden', 'shown', None],
+                       'AUC': [0.5, np.nan, 1.25, -0.75]})
+    x = rng.normal(size=(11, 4)).astype(dtype)
+    y = rng.normal(size=(11, 4)).astype(dtype)
+    x[:, 1] = np.nan  # a row without trajectory data
+    return df, x, y
+
+
+@pytest.mark.parametrize('dtype', ['float64', 'float32'])
+@pytest.mark.parametrize('output_format', ['parquet', 'feather'])
+def test_columnar_round_trip(tmp_path, output_format, dtype):
+    pytest.importorskip('pyarrow')
+    df, x, y = make_dataset(dtype)
+    path = str(tmp_path / ('all_subjects.' + output_format))
+    write_unified_dataset(df, x, y, path, {'dtype': dtype})
+    for memory_map in [False, True]:
+        read_df, read_x, read_y = read_unified_dataset(path, memory_map=memory_map)
+        pd.testing.assert_frame_equal(read_df, df)
+        np.testing.assert_array_equal(read_x, x)
+        np.testing.assert_array_equal(read_y, y)
+        assert read_x.dtype == dtype and read_y.dtype == dtype
+    assert read_metadata(path)['num_timepoints'] == 11
+
+
+def test_csv_round_trip(tmp_path):
+    df, x, y = make_dataset('float32')
+    path = str(tmp_path / 'all_subjects.csv')
+    write_unified_dataset(df, x, y, path, {'dtype': 'float32'})
+    read_df, read_x, read_y = read_unified_dataset(path)
+    pd.testing.assert_frame_equal(read_df[df.columns], df)
+    np.testing.assert_array_equal(read_x, x)
+    assert read_y.dtype == np.float32
+
+
+def test_columnar_formats_need_pyarrow(monkeypatch):
+    check_output_format('csv')
+    with pytest.raises(ValueError):
+        check_output_format('xlsx')
+    monkeypatch.setitem(sys.modules, 'pyarrow', None)  # import pyarrow fails
+    with pytest.raises(ImportError, match='pyarrow'):
+        check_output_format('parquet')
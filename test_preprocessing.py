@@ -0,0 +1,99 @@
+import sys
+sys.path.append('code')
+import numpy as np
+import pandas as pd
+import pytest
+from Preprocessing import Preprocessing
+
+
+def write_subject(path, x_cords, y_cords, **columns):
+    pd.DataFrame({'x_cord': x_cords, 'y_cord': y_cords, **columns}).to_csv(path, index=False)
+    return str(path)
+
+
+def test_malformed_token_in_one_axis_is_dropped_from_both(tmp_path):
+    path = write_subject(tmp_path / 'subject.csv', ["0,10,,30,40", "0,10,20"], ["0,1,2,3,4", "0,1,2"])
+    subject = Preprocessing(path, 'x_cord', 'y_cord', num_timepoints=4)
+    np.testing.assert_array_equal(subject.malformed_rows, [0])
+    subject.normalize_time_points()
+    # the sample (20, 2) is dropped from both axes: (0,0),(10,1),(30,3),(40,4) resampled to 4 points
+    np.testing.assert_allclose(subject.x[:, 0], [0, 10, 30, 40])
+    np.testing.assert_allclose(subject.y[:, 0], [0, 1, 3, 4])
+    np.testing.assert_allclose(subject.x[:, 1], [0, 20 / 3, 40 / 3, 20])
+
+
+def test_malformed_timestamp_is_dropped_from_the_coordinates(tmp_path):
+    path = write_subject(tmp_path / 'subject.csv', ["0,10,20,30"], ["0,1,2,3"], t=["100,110,abc,130"])
+    subject = Preprocessing(path, 'x_cord', 'y_cord', time_column='t')
+    np.testing.assert_array_equal(subject.x[:3, 0], [0, 10, 30])
+    np.testing.assert_array_equal(subject.y[:3, 0], [0, 1, 3])
+    np.testing.assert_array_equal(subject.t[:3, 0], [0, 10, 30])
+
+
+@pytest.mark.parametrize('num_timepoints', [0, 1, -5, 50.5, '101', True])
+def test_invalid_num_timepoints_is_rejected(tmp_path, num_timepoints):
+    path = write_subject(tmp_path / 'subject.csv', ["0,10,20"], ["0,1,2"])
+    with pytest.raises(ValueError):
+        Preprocessing(path, 'x_cord', 'y_cord', num_timepoints=num_timepoints)
+
+
+def test_integral_num_timepoints_is_accepted(tmp_path):
+    path = write_subject(tmp_path / 'subject.csv', ["0,10,20"], ["0,1,2"])
+    assert Preprocessing(path, 'x_cord', 'y_cord', num_timepoints=np.int64(2)).NUM_TIMEPOINTS == 2
+    assert Preprocessing(path, 'x_cord', 'y_cord', num_timepoints=51.0).NUM_TIMEPOINTS == 51
+
+
+def write_random_subject(path, num_trials=200, seed=0):
+    """
+    Integer-pixel trajectories toward both targets, with pauses and direction changes (ties in x).
+    """
+    rng = np.random.default_rng(seed)
+    x_cords, y_cords = [], []
+    for _ in range(num_trials):
+        num_samples = rng.integers(10, 40)
+        side = rng.choice([-1, 1])
+        x = 640 + side * np.round(np.linspace(0, 240, num_samples) + rng.normal(0, 15, num_samples))
+        x = np.where(rng.random(num_samples) < 0.3, np.roll(x, 1), x)  # repeated samples
+        x[0], x[-1] = 640, 640 + side * 240
+        y = np.round(np.linspace(560, 250, num_samples))
+        x_cords.append(','.join(str(int(value)) for value in x))
+        y_cords.append(','.join(str(int(value)) for value in y))
+    return write_subject(path, x_cords, y_cords)
+
+
+def test_lazy_measures_match_the_full_pipeline(tmp_path):
+    path = write_random_subject(tmp_path / 'subject.csv')
+    full = Preprocessing(path, 'x_cord', 'y_cord')
+    full.normalize_time_points()
+    full.rescale()
+    full.remap_trajectories()
+    full.calculate_all_measures()
+
+    lazy = Preprocessing(path, 'x_cord', 'y_cord')
+    lazy.calculate_all_measures()
+    selected = Preprocessing(path, 'x_cord', 'y_cord')
+    selected.calculate_all_measures(['flips', 'RPB'])
+    pd.testing.assert_frame_equal(lazy.df, full.df)
+    pd.testing.assert_frame_equal(selected.df, full.df[selected.df.columns])
+
+
+def test_selected_measures_are_memoized_until_a_stage_is_run_again(tmp_path):
+    path = write_random_subject(tmp_path / 'subject.csv', num_trials=20)
+    subject = Preprocessing(path, 'x_cord', 'y_cord')
+    subject.calculate_all_measures(['initiation_correspondence'])
+    assert set(subject.measure_values) == {'initiation_angle', 'initiation_correspondence'}
+    assert 'AUC' not in subject.df.columns
+    assert subject.stages_done == ['normalize', 'rescale', 'remap']
+    angle = subject.get_measure('initiation_angle')
+    assert subject.get_measure('initiation_angle') is angle
+    subject.remap_trajectories()
+    assert subject.measure_values == {}
+
+
+@pytest.mark.parametrize('num_timepoints', [2, 4, 101])
+def test_initiation_angle_at_low_resolution(tmp_path, num_timepoints):
+    # straight trajectories at 45 degrees toward both targets
+    path = write_subject(tmp_path / 'subject.csv', ["640,540,440", "640,740,840"], ["560,460,360"] * 2)
+    subject = Preprocessing(path, 'x_cord', 'y_cord', num_timepoints=num_timepoints)
+    assert subject.point_of_angle >= 1
+    np.testing.assert_allclose(subject.get_measure('initiation_angle'), np.degrees(np.arctan(1.5)))
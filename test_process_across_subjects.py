@@ -0,0 +1,90 @@
+import sys
+sys.path.append('code')
+sys.path.append('benchmarks')
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import pandas as pd
+import pytest
+from process_across_subjects import bounded_map, process_across_subjects
+from rank_choices import process_folder
+from synthetic_data import generate_study
+
+
+def test_bounded_map_keeps_order_and_window():
+    submitted = []
+    lock = threading.Lock()
+
+    def square(item):
+        with lock:
+            submitted.append(item)
+        return item * item
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = bounded_map(executor, square, range(10), window=3)
+        assert next(results) == 0
+        assert len(submitted) <= 4  # the window plus the one submitted after the first result
+        assert list(results) == [item * item for item in range(1, 10)]
+
+
+def test_choice_ranks_match_the_standalone_script(tmp_path):
+    data_directory, output_directory = tmp_path / 'data', tmp_path / 'output'
+    data_directory.mkdir()
+    output_directory.mkdir()
+    for i in range(4):
+        pd.DataFrame({
+            'x_cord': ["0,-5,-10", "0,5,10"] * 4,
+            'y_cord': ["0,5,10"] * 8,
+            'Left_option': ['a', 'a', 'b', 'a', 'c', 'b', 'b', 'a'],
+            'Right_option': ['b', 'c', 'c', 'b', 'a', 'c', 'c', 'c'],
+            'choice': ['b', 'a', 'b', 'a', 'c', 'c', 'b', 'c'],
+        }).to_csv(data_directory / ('subject_' + str(i) + '.csv'), index=False)
+
+    path = process_across_subjects(str(data_directory), str(output_directory), 'x_cord', 'y_cord',
+                                   rank_choices=True, rank_practice_trials=1, rank_seed=3, num_workers=2)
+    ranked = pd.concat([pd.read_csv(out_path) for out_path in
+                        process_folder(data_directory, tmp_path / 'ranked', 1, seed=3)], ignore_index=True)
+    unified = pd.read_csv(path)
+    for column in ['choice_rank_string', 'choice_is_higher_ranked', 'choice_is_one_more', 'total_one_more_true']:
+        assert unified[column].tolist() == ranked[column].tolist()
+
+
+def make_study(tmp_path, num_subjects=3):
+    data_directory, output_directory = str(tmp_path / 'data'), str(tmp_path / 'output')
+    os.makedirs(output_directory)
+    paths = generate_study(data_directory, num_subjects, num_trials=6, num_samples=15, num_extra_rows=2)
+    return data_directory, output_directory, paths
+
+
+def unified_csv(data_directory, output_directory, **kwargs):
+    path = process_across_subjects(data_directory, output_directory, 'x_cord', 'y_cord', '', ['response'], **kwargs)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def test_streamed_output_is_identical_to_the_merged_output(tmp_path):
+    data_directory, output_directory, paths = make_study(tmp_path)
+    assert unified_csv(data_directory, output_directory, stream_output=True) == \
+        unified_csv(data_directory, output_directory)
+
+    # a column missing in a later subject is left empty in both
+    for path in paths[:2]:
+        pd.read_csv(path).assign(note='text').to_csv(path, index=False)
+    assert unified_csv(data_directory, output_directory, stream_output=True) == \
+        unified_csv(data_directory, output_directory)
+
+
+def test_streaming_rejects_columns_missing_in_the_first_subject(tmp_path):
+    data_directory, output_directory, paths = make_study(tmp_path)
+    pd.read_csv(paths[2]).assign(note='text').to_csv(paths[2], index=False)
+    with pytest.raises(ValueError, match='note'):
+        unified_csv(data_directory, output_directory, stream_output=True)
+    # only the kept columns matter
+    unified_csv(data_directory, output_directory, stream_output=True, columns_to_keep=['trajectory'])
+
+
+def test_unified_file_does_not_depend_on_the_number_of_workers(tmp_path):
+    data_directory, output_directory, paths = make_study(tmp_path, num_subjects=5)
+    serial = unified_csv(data_directory, output_directory, num_workers=1)
+    assert unified_csv(data_directory, output_directory, num_workers=3) == serial
+    assert unified_csv(data_directory, output_directory, num_workers=3, stream_output=True) == serial
@@ -0,0 +1,62 @@
+import sys
+sys.path.append('code')
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pytest
+from profiling import SubjectProfiler
+from process_across_subjects import run_subject
+
+
+def test_total_peak_memory_spans_all_the_stages():
+    profiler = SubjectProfiler('subject.csv')
+
+    def process():
+        kept = []
+        for name in ['first', 'second']:
+            with profiler.stage(name):
+                kept.append(np.ones(1 << 20))  # 8 MB kept until the end of the run
+        return kept
+
+    profiler.run(process)
+    peaks = {record['stage']: record['peak_memory_bytes'] for record in profiler.records}
+    assert peaks['first'] >= 8 << 20 and peaks['second'] >= 8 << 20
+    assert peaks['total'] >= 16 << 20
+
+
+def test_stage_that_raises_is_recorded():
+    profiler = SubjectProfiler('subject.csv')
+
+    def process():
+        with profiler.stage('load', rows=3):
+            raise ValueError("malformed file")
+
+    with pytest.raises(ValueError):
+        profiler.run(process)
+    assert [record['stage'] for record in profiler.records] == ['load', 'total']
+    assert profiler.records[0]['rows'] == 3
+
+
+def test_timing_without_memory_tracing():
+    profiler = SubjectProfiler('subject.csv', trace_memory=False)
+
+    def process():
+        with profiler.stage('load'):
+            return np.ones(10)
+
+    profiler.run(process)
+    assert [record['stage'] for record in profiler.records] == ['load', 'total']
+    assert all(record['peak_memory_bytes'] is None and not record['memory_traced'] for record in profiler.records)
+    assert not tracemalloc.is_tracing()
+
+
+def test_loading_is_split_into_stages(tmp_path):
+    path = str(tmp_path / 'subject.csv')
+    pd.DataFrame({'x_cord': ["640,540,440", "640,740,840"], 'y_cord': ["560,460,360"] * 2}).to_csv(path, index=False)
+    options = dict(x_cord_column='x_cord', y_cord_column='y_cord')
+    _, records = run_subject(path, options, profile=True)
+    stages = [record['stage'] for record in records]
+    assert stages[:3] == ['read_csv', 'filter_rows', 'parse_coordinates']
+    assert stages[-1] == 'total'
+    parse = records[2]
+    assert parse['trials'] == 2 and parse['max_samples'] == 3 and parse['memory_traced']
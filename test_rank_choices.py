@@ -0,0 +1,55 @@
+import sys
+sys.path.append('code')
+import numpy as np
+import pandas as pd
+from rank_choices import rank_dataframe, process_folder
+
+
+def make_choices():
+    return pd.DataFrame({
+        'Left_option':  ['a', 'a', 'b', 'a', 'c', 'b', np.nan, 'a'],
+        'Right_option': ['b', 'c', 'c', 'b', 'a', 'c', np.nan, 'c'],
+        'choice':       ['b', 'a', 'b', 'a', 'a', 'c', np.nan, 'x'],
+    })
+
+
+def test_rank_columns():
+    df = rank_dataframe(make_choices(), practice_trials=1, rng=0)
+    # practice row 0 is excluded: a is chosen 3 times, b once, c once (the tie between b and c is broken randomly)
+    assert df['choice_rank_string'][0].startswith('1: a (3), 2: ')
+    assert df['choice_is_higher_ranked'].tolist() == [pd.NA, True, False, True, True, False, pd.NA, False]
+    assert df['choice_is_one_more'].tolist() == [pd.NA, False, False, False, False, False, pd.NA, False]
+    assert df['choice_is_higher_ranked'].dtype == 'boolean'
+    assert (df['total_one_more_true'] == 0).all()
+
+
+def test_tie_break_is_reproducible_with_a_seed():
+    rank_strings = {rank_dataframe(make_choices(), 1, rng=seed)['choice_rank_string'][0] for seed in range(20)}
+    assert len(rank_strings) == 2  # b and c are tied
+    assert rank_dataframe(make_choices(), 1, rng=5)['choice_rank_string'][0] == \
+        rank_dataframe(make_choices(), 1, rng=5)['choice_rank_string'][0]
+
+
+def test_process_folder_merges_and_skips_up_to_date(tmp_path):
+    for i in range(3):
+        make_choices().to_csv(tmp_path / ('subject_' + str(i) + '.csv'), index=False)
+    merged_path = tmp_path / 'merged.csv'
+    out_paths = process_folder(tmp_path, tmp_path / 'ranked', 1, num_workers=2, merged_path=merged_path, seed=7)
+    merged = pd.read_csv(merged_path)
+    assert len(merged) == 3 * len(make_choices())
+    assert merged['source_file'].unique().tolist() == ['subject_0.csv', 'subject_1.csv', 'subject_2.csv']
+
+    modified = [path.stat().st_mtime_ns for path in out_paths]
+    process_folder(tmp_path, tmp_path / 'ranked', 1, merged_path=merged_path, skip_up_to_date=True, seed=7)
+    assert [path.stat().st_mtime_ns for path in out_paths] == modified
+    assert pd.read_csv(merged_path).equals(merged)
+
+
+def test_file_seeds_do_not_depend_on_the_other_files(tmp_path):
+    for name in ['subject_1.csv', 'subject_2.csv']:
+        make_choices().to_csv(tmp_path / name, index=False)
+    ranked = {seed: pd.read_csv(process_folder(tmp_path, tmp_path / 'ranked', 1, seed=seed)[1])
+              for seed in range(10)}
+    make_choices().to_csv(tmp_path / 'subject_0.csv', index=False)  # shifts the position of the other files
+    for seed in range(10):
+        assert pd.read_csv(process_folder(tmp_path, tmp_path / 'ranked', 1, seed=seed)[2]).equals(ranked[seed])
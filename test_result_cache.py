@@ -0,0 +1,67 @@
+import sys
+sys.path.append('code')
+sys.path.append('benchmarks')
+import os
+import pandas as pd
+from process_across_subjects import process_across_subjects
+from synthetic_data import generate_study
+
+
+def make_study(tmp_path, num_subjects=3):
+    data_directory, output_directory = str(tmp_path / 'data'), str(tmp_path / 'output')
+    os.makedirs(output_directory)
+    paths = generate_study(data_directory, num_subjects, num_trials=6, num_samples=15, num_extra_rows=2)
+    return data_directory, output_directory, paths
+
+
+def run(data_directory, output_directory, cache_directory=None, **kwargs):
+    path = process_across_subjects(data_directory, output_directory, 'x_cord', 'y_cord', '', ['response'],
+                                   cache_directory=cache_directory, **kwargs)
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def cache_entries(cache_directory):
+    return sorted(name for name in os.listdir(cache_directory) if name.endswith('.pkl'))
+
+
+def test_cache_hits_misses_and_pruning(tmp_path, capsys):
+    data_directory, output_directory, paths = make_study(tmp_path)
+    cache_directory = str(tmp_path / 'cache')
+    uncached = run(data_directory, output_directory)
+
+    assert run(data_directory, output_directory, cache_directory) == uncached
+    assert "found cached results for 0 of 3" in capsys.readouterr().out
+    entries = cache_entries(cache_directory)
+    assert len(entries) == 3
+
+    assert run(data_directory, output_directory, cache_directory) == uncached
+    assert "found cached results for 3 of 3" in capsys.readouterr().out
+    assert cache_entries(cache_directory) == entries
+
+    # a changed file is processed again, and its old entry is removed
+    df = pd.read_csv(paths[1])
+    df.loc[df.shape[0] - 1, 'rt'] += 1
+    df.to_csv(paths[1], index=False)
+    run(data_directory, output_directory, cache_directory)
+    assert "found cached results for 2 of 3" in capsys.readouterr().out
+    assert len(set(cache_entries(cache_directory)) & set(entries)) == 2
+    assert len(cache_entries(cache_directory)) == 3
+
+    # other parameters miss every entry
+    run(data_directory, output_directory, cache_directory, num_timepoints=51)
+    assert "found cached results for 0 of 3" in capsys.readouterr().out
+    assert len(cache_entries(cache_directory)) == 3
+
+
+def test_cache_hits_with_choice_ranks_without_a_seed(tmp_path, capsys):
+    data_directory, output_directory, paths = make_study(tmp_path)
+    for path in paths:
+        df = pd.read_csv(path)
+        df['Left_option'], df['Right_option'] = 'a', 'b'
+        df.to_csv(path, index=False)
+    cache_directory = str(tmp_path / 'cache')
+    run(data_directory, output_directory, cache_directory, rank_choices=True)
+    run(data_directory, output_directory, cache_directory, rank_choices=True)
+    assert "found cached results for 3 of 3" in capsys.readouterr().out
+    assert len(cache_entries(cache_directory)) == 3
@@ -0,0 +1,164 @@
+import sys
+sys.path.append('code')
+import math
+import numpy as np
+from trajectory_engine import (x_flips, returns_to_point_of_balance, area_under_curve, initiation_angle,
+                               trajectory_length, straight_line_length, max_deviation, max_deviation_sampled,
+                               resample_trajectories)
+
+NUM_TIMEPOINTS = 101
+NORMALIZED_Y = 1.5
+
+
+# Reference implementations: the original trial-by-trial loops of Preprocessing
+
+def legacy_x_flips(x):
+    flips = []
+    for trial in range(x.shape[1]):
+        bigger, smaller = False, False
+        x_count = 0
+        last_i = 0
+        for i in range(1, x.shape[0]):
+            if x[last_i, trial] > x[i, trial]:
+                last_i += 1
+                if not bigger:
+                    bigger = True
+                    smaller = False
+                    if i != 1:
+                        x_count += 1
+                else:
+                    continue
+            if x[last_i, trial] < x[i, trial]:
+                last_i += 1
+                if not smaller:
+                    bigger = False
+                    smaller = True
+                    if i != 1:
+                        x_count += 1
+                else:
+                    continue
+        flips.append(x_count)
+    return flips
+
+
+def legacy_RPB(x):
+    RPB = []
+    for trial in range(x.shape[1]):
+        crosses = 0
+        last_i = 0
+        for i in range(1, x.shape[0]):
+            if (x[last_i, trial] > 0 > x[i, trial]) or (x[last_i, trial] < 0 < x[i, trial]):
+                crosses += 1
+            last_i += 1
+        RPB.append(crosses)
+    return RPB
+
+
+def legacy_AUC(x, y):
+    trapezoid = getattr(np, 'trapezoid', None) or np.trapz
+    return [trapezoid(y[:, i] - NORMALIZED_Y * x[:, i], dx=1 / x.shape[0]) for i in range(x.shape[1])]
+
+
+def legacy_initiation_angle(x, y, point_of_angle=10):
+    return [abs(math.degrees(math.atan2(y[0, trial] - y[point_of_angle, trial],
+                                        x[point_of_angle, trial] - x[0, trial])))
+            for trial in range(x.shape[1])]
+
+
+def legacy_trajectory_length(x, y):
+    lengths = []
+    for j in range(x.shape[1]):
+        length = 0
+        for i in range(x.shape[0] - 1):
+            length += math.sqrt((x[i, j] - x[i + 1, j]) ** 2 + (y[i, j] - y[i + 1, j]) ** 2)
+        lengths.append(length)
+    return lengths
+
+
+def legacy_real_min_length(x, y):
+    return [math.sqrt((x[-1, i] - x[0, i]) ** 2 + (y[-1, i] - y[0, i]) ** 2) for i in range(x.shape[1])]
+
+
+def legacy_max_deviation(x, y):
+    max_deviations = []
+    for i in range(x.shape[1]):
+        line = np.column_stack((np.linspace(x[0, i], x[-1, i], x.shape[0]),
+                                np.linspace(y[0, i], y[-1, i], x.shape[0])))
+        distances = []
+        for j in range(x.shape[0]):
+            distances.append(min(np.linalg.norm(line - np.array([x[j, i], y[j, i]]), axis=1)))
+        max_deviations.append(max(distances))
+    return max_deviations
+
+
+def make_trajectories(num_trials=300, seed=0):
+    """
+    Random-walk trajectories with stationary stretches (repeated x values), which exercise
+    the tie handling of the x flips algorithm.
+    """
+    rng = np.random.default_rng(seed)
+    steps_x = rng.normal(0.02, 0.05, size=(NUM_TIMEPOINTS, num_trials))
+    steps_x[rng.random(steps_x.shape) < 0.3] = 0
+    steps_y = np.abs(rng.normal(0.015, 0.01, size=(NUM_TIMEPOINTS, num_trials)))
+    steps_y[0, :] = 0
+    x = np.cumsum(steps_x, axis=0) - 0.1
+    y = np.cumsum(steps_y, axis=0)
+    x[:5, :] = x[0, :]  # the cursor usually rests on the start button for a while
+    return x, y
+
+
+def test_x_flips_matches_legacy():
+    x, _ = make_trajectories()
+    np.testing.assert_array_equal(x_flips(x), legacy_x_flips(x))
+
+
+def test_x_flips_matches_legacy_on_rounded_coordinates():
+    x, _ = make_trajectories(seed=1)
+    x = np.round(x, 1)  # many ties between non-consecutive time points
+    np.testing.assert_array_equal(x_flips(x), legacy_x_flips(x))
+
+
+def test_RPB_matches_legacy():
+    x, _ = make_trajectories(seed=2)
+    np.testing.assert_array_equal(returns_to_point_of_balance(x), legacy_RPB(x))
+
+
+def test_continuous_measures_match_legacy():
+    x, y = make_trajectories(seed=3)
+    np.testing.assert_allclose(area_under_curve(x, y, NORMALIZED_Y), legacy_AUC(x, y))
+    np.testing.assert_allclose(initiation_angle(x, y, 10), legacy_initiation_angle(x, y))
+    np.testing.assert_allclose(trajectory_length(x, y), legacy_trajectory_length(x, y))
+    np.testing.assert_allclose(straight_line_length(x, y), legacy_real_min_length(x, y))
+
+
+def test_sampled_max_deviation_matches_legacy():
+    x, y = make_trajectories(seed=4)
+    np.testing.assert_allclose(max_deviation_sampled(x, y), legacy_max_deviation(x, y))
+
+
+def test_exact_max_deviation_is_the_limit_of_the_sampled_one():
+    x, y = make_trajectories(seed=5)
+    exact = max_deviation(x, y)
+    sampled = np.asarray(legacy_max_deviation(x, y))
+    assert np.all(exact <= sampled + 1e-12)
+    # the sampled line points are at most half a sampling step away from the true line
+    half_step = straight_line_length(x, y) / (NUM_TIMEPOINTS - 1) / 2
+    assert np.all(sampled - exact <= half_step + 1e-12)
+
+
+def test_exact_max_deviation_of_known_trajectory():
+    x = np.array([[0.0], [1.0], [1.0]])
+    y = np.array([[0.0], [1.0], [2.0]])
+    np.testing.assert_allclose(max_deviation(x, y), [1 / math.sqrt(5)])
+
+
+def test_float32_matches_float64_within_tolerance():
+    x, y = make_trajectories(seed=6)
+    x32 = resample_trajectories(x.astype(np.float32), NUM_TIMEPOINTS)
+    y32 = resample_trajectories(y.astype(np.float32), NUM_TIMEPOINTS)
+    assert x32.dtype == np.float32
+    np.testing.assert_allclose(x32, resample_trajectories(x, NUM_TIMEPOINTS), atol=1e-6)
+    np.testing.assert_allclose(area_under_curve(x32, y32, NORMALIZED_Y), area_under_curve(x, y, NORMALIZED_Y),
+                               atol=1e-5)
+    np.testing.assert_allclose(max_deviation(x32, y32), max_deviation(x, y), atol=1e-5)
+    np.testing.assert_allclose(initiation_angle(x32, y32, 10), initiation_angle(x, y, 10), atol=1e-3)
@@ -0,0 +1,55 @@
+import sys
+sys.path.append('code')
+import numpy as np
+from trajectory_stats import subject_means, bootstrap_ci, permutation_test
+
+NUM_TIMEPOINTS = 101
+
+
+def make_subject_means(num_subjects=20, effect=0.0, seed=0):
+    """
+    Subject mean trajectories of two within-subject conditions; condition A deviates from B by `effect`
+    in the middle of the trajectory.
+    """
+    rng = np.random.default_rng(seed)
+    time = np.linspace(0, 1, NUM_TIMEPOINTS)[:, np.newaxis]
+    base = time + rng.normal(0, 0.1, size=(1, num_subjects)) * np.sin(np.pi * time)
+    bump = effect * np.exp(-((time - 0.5) / 0.1) ** 2)
+    noise = rng.normal(0, 0.05, size=(2, NUM_TIMEPOINTS, num_subjects))
+    return base + bump + noise[0], base + noise[1]
+
+
+def test_subject_means():
+    coordinates = np.array([[1.0, 2.0, 3.0, 5.0], [0.0, 0.0, 1.0, 1.0]])
+    subject_ids, means = subject_means(coordinates, [2, 1, 2, 1])
+    np.testing.assert_array_equal(subject_ids, [1, 2])
+    np.testing.assert_allclose(means, [[3.5, 2.0], [0.5, 0.5]])
+
+
+def test_bootstrap_is_reproducible_for_any_number_of_workers():
+    means_a, _ = make_subject_means()
+    single = bootstrap_ci(means_a, num_resamples=500, rng=1, batch_size=100)
+    parallel = bootstrap_ci(means_a, num_resamples=500, rng=1, batch_size=100, num_workers=2)
+    np.testing.assert_array_equal(single['lower'], parallel['lower'])
+    assert np.all(single['lower'] <= single['mean']) and np.all(single['mean'] <= single['upper'])
+    # the bootstrap SE of the mean is close to the analytical one
+    analytical = means_a.std(axis=1, ddof=1) / np.sqrt(means_a.shape[1])
+    np.testing.assert_allclose(single['standard_error'][1:], analytical[1:], rtol=0.25)
+
+
+def test_permutation_test_finds_the_cluster_of_the_effect():
+    means_a, means_b = make_subject_means(effect=0.2)
+    result = permutation_test(means_a, means_b, num_permutations=500, rng=2)
+    significant = [cluster for cluster in result['clusters'] if cluster['p_value'] < 0.05]
+    assert len(significant) == 1
+    assert significant[0]['start'] < 50 < significant[0]['end']
+
+    independent = permutation_test(means_a, means_b, paired=False, num_permutations=500, rng=2)
+    assert any(cluster['p_value'] < 0.05 and cluster['start'] < 50 < cluster['end']
+               for cluster in independent['clusters'])
+
+
+def test_permutation_test_without_effect():
+    means_a, means_b = make_subject_means(effect=0.0, seed=3)
+    result = permutation_test(means_a, means_b, num_permutations=500, rng=4)
+    assert all(cluster['p_value'] > 0.05 for cluster in result['clusters'])
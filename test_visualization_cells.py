@@ -0,0 +1,100 @@
+import sys
+sys.path.append('code')
+import re
+import numpy as np
+import pandas as pd
+import pytest
+from output_formats import write_unified_dataset
+from Visualization import Visualization
+
+NUM_TIMEPOINTS = 11
+
+
+def write_study(path):
+    """
+    A small unified dataset: 4 subjects with trials in a 2x2 design and a row without trajectory data each,
+    subject 4 is not OK.
+    """
+    rng = np.random.default_rng(0)
+    rows = []
+    for subject in range(1, 5):
+        for trial in range(int(rng.integers(4, 9))):
+            rows.append({'subject_id': subject, 'is_OK': subject != 4,
+                         'trajectory': ['shown', 'hidden'][trial % 2], 'side': ['a', 'b'][trial // 2 % 2]})
+        rows.append({'subject_id': subject, 'is_OK': subject != 4, 'trajectory': np.nan, 'side': np.nan})
+    df = pd.DataFrame(rows)
+    x = rng.normal(size=(NUM_TIMEPOINTS, df.shape[0]))
+    y = rng.normal(size=(NUM_TIMEPOINTS, df.shape[0]))
+    x[:, df['trajectory'].isna()] = np.nan
+    y[:, df['trajectory'].isna()] = np.nan
+    write_unified_dataset(df, x, y, path)
+    return df, x, y
+
+
+def make_visualization(path, output_directory, subjects_to_remove=(), memory_map=False):
+    return Visualization(path, output_directory, 'study', 'trajectory', [], 'side', [], 16, 12, 10, 12, 4,
+                         [(205, 92, 92), (0, 206, 209)], 1, list(subjects_to_remove), memory_map=memory_map,
+                         headless=True)
+
+
+def test_memory_mapped_cells_match_the_loaded_arrays(tmp_path):
+    pytest.importorskip('pyarrow')
+    path = str(tmp_path / 'all_subjects.parquet')
+    write_study(path)
+    loaded = make_visualization(path, str(tmp_path), subjects_to_remove=[2])
+    mapped = make_visualization(path, str(tmp_path), subjects_to_remove=[2], memory_map=True)
+    assert isinstance(mapped.x, np.memmap) or isinstance(mapped.x.base, np.memmap)
+    for cond_1 in ['shown', 'hidden']:
+        for cond_2 in ['a', 'b']:
+            statistics = zip(loaded.cell_statistics(cond_1, cond_2), mapped.cell_statistics(cond_1, cond_2))
+            for expected, actual in statistics:
+                np.testing.assert_array_equal(actual, expected)
+            np.testing.assert_array_equal(np.asarray(mapped.x[:, mapped.cell_rows(cond_1, cond_2, 3)]),
+                                          loaded.x[:, loaded.cell_rows(cond_1, cond_2, 3)])
+
+
+def test_cell_rows_match_the_boolean_mask_selection(tmp_path):
+    path = str(tmp_path / 'all_subjects.csv')
+    df, x, y = write_study(path)
+    viz = make_visualization(path, str(tmp_path), subjects_to_remove=[2])
+    selected = (df['is_OK'] == True) & ~df['subject_id'].isin([2])
+    for cond_1 in ['shown', 'hidden']:
+        for cond_2 in ['a', 'b']:
+            in_cell = selected & (df['trajectory'] == cond_1) & (df['side'] == cond_2)
+            np.testing.assert_array_equal(viz.cell_rows(cond_1, cond_2), np.flatnonzero(in_cell))
+            for subject in [1, 3]:
+                np.testing.assert_array_equal(viz.cell_rows(cond_1, cond_2, subject),
+                                              np.flatnonzero(in_cell & (df['subject_id'] == subject)))
+    assert len(viz.cell_rows('shown', 'a', 2)) == 0 and len(viz.cell_rows('shown', 'a', 4)) == 0
+
+
+def test_cell_statistics_are_the_grand_mean_and_between_subject_se(tmp_path):
+    path = str(tmp_path / 'all_subjects.csv')
+    df, x, y = write_study(path)
+    viz = make_visualization(path, str(tmp_path), subjects_to_remove=[2])
+    keys, mean_x, mean_y, num_trials = viz.get_subject_means()
+    assert sorted(set(key[0] for key in keys)) == [1, 3]
+
+    in_cell = (df['trajectory'] == 'hidden') & (df['side'] == 'b')
+    subject_x = np.stack([x[:, (in_cell & (df['subject_id'] == subject)).to_numpy()].mean(axis=1)
+                          for subject in [1, 3]], axis=1)
+    subject_y = np.stack([y[:, (in_cell & (df['subject_id'] == subject)).to_numpy()].mean(axis=1)
+                          for subject in [1, 3]], axis=1)
+    expected = (subject_x.mean(axis=1), subject_y.mean(axis=1),
+                subject_x.std(axis=1, ddof=1) / np.sqrt(2), subject_y.std(axis=1, ddof=1) / np.sqrt(2))
+    for expected_value, value in zip(expected, viz.cell_statistics('hidden', 'b')):
+        np.testing.assert_allclose(value, expected_value)
+    assert num_trials[keys.index((1, 'hidden', 'b'))] == (in_cell & (df['subject_id'] == 1)).sum()
+
+
+@pytest.mark.parametrize('num_workers', [1, 2])
+def test_subject_report_has_a_page_per_subject(tmp_path, num_workers):
+    path = str(tmp_path / 'all_subjects.csv')
+    write_study(path)
+    viz = make_visualization(path, str(tmp_path), subjects_to_remove=[2])
+    pdf_path = viz.save_subject_report(num_workers=num_workers, dpi=20)
+    with open(pdf_path, 'rb') as f:
+        assert len(re.findall(rb'/Type\s*/Page\b', f.read())) == 3
+    html_path = viz.save_subject_report(str(tmp_path / 'report.html'), num_workers, dpi=20)
+    with open(html_path) as f:
+        assert f.read().count('<img src="data:image/png;base64,') == 3